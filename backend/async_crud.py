@@ -0,0 +1,80 @@
+"""
+Async counterparts of the crud functions, for use with database.get_async_db
+(or database.get_session when ASYNC_DB=1).
+
+Reads are native async selects. Writes reuse the sync crud functions through
+AsyncSession.run_sync, so cost calculation, rollups and audit logging stay in
+one place and behave identically in both modes.
+"""
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+import models, schemas, crud
+
+
+def _product_select(columns=None):
+    stmt = select(models.Product)
+    if columns:
+        stmt = stmt.options(load_only(*(getattr(models.Product, c) for c in columns)))
+    return stmt
+
+
+async def get_user_by_username(db: AsyncSession, username: str):
+    result = await db.execute(select(models.User).where(models.User.username == username))
+    return result.scalars().first()
+
+
+async def get_product(db: AsyncSession, product_id: int):
+    return await db.get(models.Product, product_id)
+
+
+async def get_products(db: AsyncSession, skip: int = 0, limit: int = 100, columns=None):
+    result = await db.execute(
+        _product_select(columns).order_by(models.Product.id.desc()).offset(skip).limit(limit)
+    )
+    return result.scalars().all()
+
+
+async def get_products_page(db: AsyncSession, cursor: str = None, limit: int = 100, columns=None):
+    stmt = _product_select(crud.cursor_columns(columns))
+    if cursor:
+        stmt = stmt.where(models.Product.id < crud.decode_cursor(cursor))
+    result = await db.execute(stmt.order_by(models.Product.id.desc()).limit(limit + 1))
+    rows = result.scalars().all()
+    has_more = len(rows) > limit
+    items = rows[:limit]
+    next_cursor = crud.encode_cursor(items[-1]) if has_more else None
+    return {"items": items, "next_cursor": next_cursor, "has_more": has_more}
+
+
+async def get_products_fingerprint(db: AsyncSession):
+    result = await db.execute(select(
+        func.count(models.Product.id),
+        func.max(models.Product.id),
+        func.max(models.Product.updated_at),
+    ))
+    return result.one()
+
+
+async def get_product_updated_at(db: AsyncSession, product_id: int):
+    result = await db.execute(select(models.Product.updated_at).where(models.Product.id == product_id))
+    row = result.first()
+    if row is None:
+        return False, None
+    return True, row[0]
+
+
+async def create_product(db: AsyncSession, product: schemas.ProductCreate, user_id: int):
+    return await db.run_sync(lambda session: crud.create_product(session, product, user_id))
+
+
+async def update_product(db: AsyncSession, product_id: int, product_update: schemas.ProductUpdate, user_id: int):
+    return await db.run_sync(lambda session: crud.update_product(session, product_id, product_update, user_id))
+
+
+async def delete_product(db: AsyncSession, product_id: int, user_id: int):
+    return await db.run_sync(lambda session: crud.delete_product(session, product_id, user_id))
+
+
+async def apply_batch(db: AsyncSession, operations, user_id: int):
+    return await db.run_sync(lambda session: crud.apply_batch(session, operations, user_id))
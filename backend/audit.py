@@ -0,0 +1,219 @@
+"""
+Audit log sink.
+
+AUDIT_MODE=transactional (default): the audit row is added to the caller's
+session and commits atomically with the product change - one commit per write,
+and an audit row exists if and only if the change does.
+
+AUDIT_MODE=buffered: events are held on the session until it commits, then
+handed to a bounded in-memory queue. A background thread writes them with one
+bulk INSERT every AUDIT_BATCH_SIZE events or AUDIT_FLUSH_INTERVAL_MS, whichever
+comes first, so user requests never wait on audit writes. Events queued but not
+yet written are lost if the process dies; `stop()` drains the queue on shutdown.
+If the flusher isn't running, events take the transactional path; if the queue
+is full, the committing thread writes them itself.
+
+Details are kept small: creates store the full row ("after"), updates only the
+changed fields ({"changes": {field: [old, new]}}), deletes the final row
+("before"). crud.get_product_state_at replays them to rebuild past states.
+"""
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
+import models
+from database import SessionLocal
+
+AUDIT_MODE = os.getenv("AUDIT_MODE", "transactional").lower()
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "200"))
+AUDIT_FLUSH_INTERVAL_MS = int(os.getenv("AUDIT_FLUSH_INTERVAL_MS", "500"))
+AUDIT_MAX_RETRIES = int(os.getenv("AUDIT_MAX_RETRIES", "3"))
+
+# Session.info key holding events waiting for that session to commit
+_PENDING_KEY = "audit_pending"
+
+
+def column_values(obj) -> dict:
+    """Raw column values of an ORM row; JSON encoding happens once, in the column serializer."""
+    return {c.key: getattr(obj, c.key) for c in obj.__table__.columns}
+
+
+def diff(before: dict, after: dict) -> dict:
+    """{field: [old, new]} for the fields whose value changed."""
+    return {k: [before.get(k), v] for k, v in after.items() if before.get(k) != v}
+
+
+def make_event(user_id, product_id, action, details, timestamp=None) -> dict:
+    return {
+        "user_id": user_id,
+        "product_id": product_id,
+        "action": action,
+        "details": details,
+        "timestamp": timestamp or datetime.utcnow(),
+    }
+
+
+class AuditSink:
+    def __init__(self, mode: str = AUDIT_MODE, session_factory=SessionLocal, maxsize: int = AUDIT_QUEUE_SIZE,
+                 batch_size: int = AUDIT_BATCH_SIZE, flush_interval_ms: int = AUDIT_FLUSH_INTERVAL_MS):
+        if mode not in ("transactional", "buffered"):
+            raise ValueError(f"Unknown AUDIT_MODE: {mode}")
+        self.mode = mode
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._stop = threading.Event()
+        self._thread = None
+        self.written = 0
+        self.dropped = 0
+        self.fallbacks = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def buffered(self) -> bool:
+        return self.mode == "buffered" and self.running
+
+    # Producer side
+
+    def record(self, db: Session, user_id, product_id, action: str, details, timestamp=None):
+        self.record_many(db, [make_event(user_id, product_id, action, details, timestamp)])
+
+    def record_many(self, db: Session, events):
+        """Queue events for `db`'s transaction; the caller commits as usual."""
+        if not events:
+            return
+        if self.buffered:
+            # Published only once the product change has actually committed
+            db.info.setdefault(_PENDING_KEY, []).extend(events)
+        else:
+            self._write_in_transaction(db, events)
+
+    def _write_in_transaction(self, db: Session, events):
+        if len(events) == 1:
+            db.add(models.AuditLog(**events[0]))
+        else:
+            db.execute(insert(models.AuditLog), events)
+
+    def _publish(self, events):
+        for i, item in enumerate(events):
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                self._write_now(events[i:])
+                return
+
+    def _write_now(self, events):
+        # Synchronous fallback: the producing transaction is already committed
+        self.fallbacks += len(events)
+        db = self.session_factory()
+        try:
+            db.execute(insert(models.AuditLog), events)
+            db.commit()
+            self.written += len(events)
+        except Exception as e:
+            db.rollback()
+            self.dropped += len(events)
+            print(f"AUDIT ERROR: dropped {len(events)} events: {e}")
+        finally:
+            db.close()
+
+    # Flusher side
+
+    def start(self):
+        if self.mode != "buffered" or self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="audit-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Stop the flusher after writing everything still queued."""
+        if not self.running:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+        # Anything left (join timed out or raced with shutdown) is written inline
+        leftover = self._drain(self._queue.qsize())
+        if leftover:
+            self._write_now(leftover)
+
+    def flush(self):
+        """Block until every event queued so far has been written."""
+        if self.running:
+            self._queue.join()
+
+    def _drain(self, limit: int, timeout: float = 0.0):
+        batch = []
+        deadline = time.monotonic() + timeout
+        while len(batch) < limit:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            # Wait for the first event, then keep collecting until the batch
+            # is full or the flush interval has passed
+            batch = self._drain(1, timeout=self.flush_interval)
+            if batch:
+                batch += self._drain(self.batch_size - 1, timeout=self.flush_interval)
+                self._write_batch(batch)
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write_batch(self, batch):
+        for attempt in range(1, AUDIT_MAX_RETRIES + 1):
+            db = self.session_factory()
+            try:
+                db.execute(insert(models.AuditLog), batch)
+                db.commit()
+                self.written += len(batch)
+                return
+            except Exception as e:
+                db.rollback()
+                print(f"AUDIT ERROR: batch of {len(batch)} failed (attempt {attempt}): {e}")
+                time.sleep(min(0.1 * 2 ** attempt, 2.0))
+            finally:
+                db.close()
+        self.dropped += len(batch)
+        print(f"AUDIT ERROR: dropped {len(batch)} events after {AUDIT_MAX_RETRIES} attempts")
+
+
+sink = AuditSink()
+
+
+def record(db: Session, user_id, product_id, action: str, details, timestamp=None):
+    sink.record(db, user_id, product_id, action, details, timestamp)
+
+
+def record_many(db: Session, events):
+    sink.record_many(db, events)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_on_commit(session):
+    events = session.info.pop(_PENDING_KEY, None)
+    if events:
+        sink._publish(events)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_on_rollback(session, previous_transaction):
+    # A savepoint rollback leaves the outer transaction (and its events) alive
+    if not previous_transaction.nested:
+        session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,171 @@
+"""
+Audit log retention.
+
+archive(): moves audit rows older than AUDIT_RETENTION_DAYS out of audit_logs
+into audit_log_archive, one gzipped NDJSON blob per batch of rows, committing
+after every batch so the job can be stopped and rerun at any time.
+
+compact(): merges runs of consecutive "Updated Product" diffs by the same user
+into the last entry of the run ({field: [first old, last new]}), for entries
+older than AUDIT_COMPACT_DAYS. Intermediate states inside a run are lost; the
+merged entry keeps the run's start in "merged_since" so that
+crud.get_product_state_at can refuse points in time it can no longer rebuild.
+It likewise refuses anything older than the newest archived entry
+(archived_until()); that history is only available from the archive.
+
+CLI: python audit_retention.py [--days N] [--compact] [--compact-days N] [--batch-size N]
+"""
+import gzip
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm import Session
+import models, serialization
+
+AUDIT_RETENTION_DAYS = int(os.getenv("AUDIT_RETENTION_DAYS", "365"))
+AUDIT_COMPACT_DAYS = int(os.getenv("AUDIT_COMPACT_DAYS", "30"))
+BATCH_SIZE = int(os.getenv("AUDIT_ARCHIVE_BATCH_SIZE", "5000"))
+
+_COLUMNS = [c for c in models.AuditLog.__table__.columns]
+
+
+def pack(rows) -> bytes:
+    return gzip.compress("".join(serialization.dumps(dict(r)) + "\n" for r in rows).encode("utf-8"))
+
+
+def unpack(archive: models.AuditLogArchive):
+    """Rows of an archive batch as dicts (timestamps stay ISO strings)."""
+    text = gzip.decompress(archive.payload).decode("utf-8")
+    return [serialization.loads(line) for line in text.splitlines() if line]
+
+
+def archived_until(db: Session):
+    """Timestamp of the newest archived audit row, or None if nothing was archived."""
+    return db.query(func.max(models.AuditLogArchive.range_end)).scalar()
+
+
+def archive(db: Session, days: int = AUDIT_RETENTION_DAYS, batch_size: int = BATCH_SIZE, progress=print):
+    """Archive rows older than `days`. Returns (rows archived, batches written)."""
+    A = models.AuditLog
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    archived = batches = 0
+    while True:
+        rows = db.execute(
+            select(*_COLUMNS).where(A.timestamp < cutoff).order_by(A.id).limit(batch_size)
+        ).mappings().all()
+        if not rows:
+            break
+        ids = [r["id"] for r in rows]
+        timestamps = [r["timestamp"] for r in rows]
+        db.add(models.AuditLogArchive(
+            first_id=ids[0],
+            last_id=ids[-1],
+            range_start=min(timestamps),
+            range_end=max(timestamps),
+            row_count=len(rows),
+            payload=pack(rows),
+        ))
+        db.execute(delete(A).where(A.id.in_(ids)))
+        db.commit()
+        archived += len(rows)
+        batches += 1
+        progress(f"  archived {archived} rows (up to {max(timestamps)})")
+    return archived, batches
+
+
+def merge_changes(runs):
+    """Combine ordered {"changes": ...} payloads into one; fields that ended where they started are dropped."""
+    merged = {}
+    for changes in runs:
+        for field, (old, new) in changes.items():
+            if field in merged:
+                merged[field][1] = new
+            else:
+                merged[field] = [old, new]
+    return {field: pair for field, pair in merged.items() if pair[0] != pair[1]}
+
+
+def _compact_rows(rows):
+    """Returns ({kept id: merged details}, [ids to delete]) for one product's ordered rows."""
+    updates, doomed = {}, []
+    run = []
+
+    def close_run():
+        if len(run) > 1:
+            updates[run[-1]["id"]] = {
+                "changes": merge_changes(r["details"]["changes"] for r in run),
+                "merged_since": run[0]["timestamp"].isoformat(),
+            }
+            doomed.extend(r["id"] for r in run[:-1])
+        run.clear()
+
+    for row in rows:
+        mergeable = row["action"] == "Updated Product" and "changes" in (row["details"] or {})
+        if not mergeable or (run and run[-1]["user_id"] != row["user_id"]):
+            close_run()
+        if mergeable:
+            run.append(row)
+    close_run()
+    return updates, doomed
+
+
+def compact(db: Session, days: int = AUDIT_COMPACT_DAYS, batch_size: int = 500, progress=print):
+    """Merge consecutive diffs older than `days`. Returns the number of rows removed."""
+    A = models.AuditLog
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    product_ids = db.execute(
+        select(A.product_id)
+        .where(A.timestamp < cutoff, A.product_id.isnot(None), A.action == "Updated Product")
+        .group_by(A.product_id)
+        .having(func.count(A.id) > 1)
+        .order_by(A.product_id)
+    ).scalars().all()
+
+    removed = 0
+    for start in range(0, len(product_ids), batch_size):
+        chunk = product_ids[start:start + batch_size]
+        rows = db.execute(
+            select(A.id, A.product_id, A.user_id, A.action, A.details, A.timestamp)
+            .where(A.product_id.in_(chunk), A.timestamp < cutoff)
+            .order_by(A.product_id, A.timestamp, A.id)
+        ).mappings().all()
+
+        updates, doomed = {}, []
+        by_product = {}
+        for row in rows:
+            by_product.setdefault(row["product_id"], []).append(row)
+        for product_rows in by_product.values():
+            u, d = _compact_rows(product_rows)
+            updates.update(u)
+            doomed.extend(d)
+
+        if updates:
+            db.execute(update(A), [{"id": i, "details": d} for i, d in updates.items()])
+        if doomed:
+            db.execute(delete(A).where(A.id.in_(doomed)))
+        db.commit()
+        removed += len(doomed)
+        progress(f"  compacted {min(start + batch_size, len(product_ids))}/{len(product_ids)} products, {removed} rows removed")
+    return removed
+
+
+if __name__ == "__main__":
+    import argparse
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Archive and compact old audit log entries.")
+    parser.add_argument("--days", type=int, default=AUDIT_RETENTION_DAYS, help="Archive entries older than this")
+    parser.add_argument("--compact", action="store_true", help="Merge consecutive update diffs first")
+    parser.add_argument("--compact-days", type=int, default=AUDIT_COMPACT_DAYS)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.compact:
+            removed = compact(db, days=args.compact_days)
+            print(f"Compaction removed {removed} audit rows.")
+        archived, batches = archive(db, days=args.days, batch_size=args.batch_size)
+        print(f"Archived {archived} audit rows in {batches} batches.")
+    finally:
+        db.close()
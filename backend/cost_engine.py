@@ -0,0 +1,131 @@
+"""
+Column-wise (NumPy) version of crud.recalculate_product_costs.
+
+Takes whole columns of input values and returns whole columns of calculated
+values, so bulk paths (imports, catalog-wide recalculation) don't pay
+per-row Python overhead. Results are identical to the scalar function,
+including rounding; test_cost_engine.py checks this row by row.
+"""
+import numpy as np
+import dimensions
+
+INPUT_COLUMNS = (
+    "price_cny", "quantity", "cny_rate", "places_count", "weight_per_box",
+    "delivery_rate_usd_per_kg", "usd_rate", "service_percent",
+    "packaging_size", "volume_m3", "total_volume",
+)
+
+OUTPUT_COLUMNS = (
+    "total_weight", "product_cost_kgs", "delivery_cost_usd", "delivery_cost_kgs",
+    "service_fee", "final_cost", "total_volume", "density",
+    # Legacy / compatibility copies of final_cost
+    "total_cost_som", "final_total_cost", "outstanding_balance",
+    # Parsed packaging size (cm) and the unit it was written in
+    "package_length", "package_width", "package_height", "package_unit",
+)
+
+
+def round_like_python(values: np.ndarray, ndigits: int) -> np.ndarray:
+    """
+    np.round(x, n) computes rint(x * 10**n) / 10**n, which matches Python's
+    correctly-rounded round() everywhere except when x * 10**n lands within
+    float error of a .5 tie. Those few elements are re-rounded with round().
+    """
+    result = np.round(values, ndigits)
+    scaled = values * (10.0 ** ndigits)
+    near_tie = np.isfinite(scaled) & (np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5) < 1e-6)
+    if near_tie.any():
+        result[near_tie] = [round(float(v), ndigits) for v in values[near_tie]]
+    return result
+
+
+def _floats(values, default):
+    """Float array where None becomes `default` (the scalar code's `x or default`)."""
+    return np.array([default if v is None else v for v in values], dtype=np.float64)
+
+
+def _nullable_floats(values):
+    """Float array keeping None as NaN, for columns whose NULL-ness matters."""
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+
+def _dimensions(packaging_sizes, places):
+    """Per-row volume (m³) and package dimensions (cm, NaN if unparsed) and unit (None if unparsed)."""
+    n = len(places)
+    volume = np.zeros(n, dtype=np.float64)
+    lengths = np.full((3, n), np.nan)
+    units = np.empty(n, dtype=object)
+    for i, (size, count) in enumerate(zip(packaging_sizes, places.tolist())):
+        # parse_dimensions is memoized, so repeated box sizes cost a dict lookup
+        dims = dimensions.parse_dimensions(size)
+        if dims is None:
+            continue
+        if count:
+            volume[i] = dims.volume_m3(count)
+        lengths[:, i] = dims.cm
+        units[i] = dims.unit
+    return volume, lengths, units
+
+
+def compute_costs(columns: dict) -> dict:
+    """
+    `columns` maps each name in INPUT_COLUMNS to a sequence of equal length
+    (missing names are treated as all-None). Returns a dict of NumPy arrays,
+    one per OUTPUT_COLUMNS entry; NaN in total_volume means NULL.
+    """
+    n = len(next(iter(columns.values()))) if columns else 0
+    get = lambda name: columns.get(name, [None] * n)
+
+    price_cny = _floats(get("price_cny"), 0.0)
+    quantity = _floats(get("quantity"), 0.0)
+    cny_rate = _floats(get("cny_rate"), 0.0)
+    places_count = _floats(get("places_count"), 0.0)
+    weight_per_box = _floats(get("weight_per_box"), 0.0)
+    delivery_rate = _floats(get("delivery_rate_usd_per_kg"), 0.0)
+    usd_rate = _floats(get("usd_rate"), 0.0)
+    service_percent = _floats(get("service_percent"), 10.0)
+
+    total_weight = round_like_python(places_count * weight_per_box, 2)
+    product_cost_kgs = round_like_python(price_cny * quantity * cny_rate, 2)
+    delivery_cost_usd = round_like_python(total_weight * delivery_rate, 2)
+    delivery_cost_kgs = round_like_python(delivery_cost_usd * usd_rate, 2)
+    service_fee = round_like_python(product_cost_kgs * (service_percent / 100), 2)
+    final_cost = round_like_python(product_cost_kgs + delivery_cost_kgs + service_fee, 2)
+
+    # Volume: parsed packaging size wins; legacy volume_m3 only fills an empty total_volume
+    places_int = np.array([int(p or 0) for p in get("places_count")], dtype=np.int64)
+    calc_vol, package_cm, package_unit = _dimensions(list(get("packaging_size")), places_int)
+    volume_m3 = _nullable_floats(get("volume_m3"))
+    total_volume = _nullable_floats(get("total_volume"))
+    use_legacy = (calc_vol <= 0) & (np.nan_to_num(volume_m3) != 0) & (np.nan_to_num(total_volume) == 0)
+    total_volume = np.where(calc_vol > 0, calc_vol, np.where(use_legacy, volume_m3, total_volume))
+
+    has_volume = np.nan_to_num(total_volume) > 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        density = np.where(has_volume, round_like_python(total_weight / np.where(has_volume, total_volume, 1.0), 2), 0.0)
+
+    return {
+        "total_weight": total_weight,
+        "product_cost_kgs": product_cost_kgs,
+        "delivery_cost_usd": delivery_cost_usd,
+        "delivery_cost_kgs": delivery_cost_kgs,
+        "service_fee": service_fee,
+        "final_cost": final_cost,
+        "total_volume": total_volume,
+        "density": density,
+        "total_cost_som": final_cost,
+        "final_total_cost": final_cost,
+        "outstanding_balance": final_cost,
+        "package_length": package_cm[0],
+        "package_width": package_cm[1],
+        "package_height": package_cm[2],
+        "package_unit": package_unit,
+    }
+
+
+def to_python(value):
+    """Convert a NumPy scalar from compute_costs back to a DB value (NaN -> None)."""
+    if value is None or isinstance(value, str):
+        return value
+    value = float(value)
+    return None if np.isnan(value) else value
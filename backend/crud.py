@@ -1,11 +1,13 @@
-from sqlalchemy.orm import Session
-import models, schemas
+from sqlalchemy import func, select, or_, and_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, load_only
+import models, schemas, rollups, settings_service, audit, audit_retention, dimensions
 from datetime import datetime
 import json
 
 def get_settings(db: Session):
-    settings = db.query(models.GlobalSettings).all()
-    return {s.key: s.value for s in settings}
+    # Served from the in-process cache; see settings_service
+    return dict(settings_service.get_settings(db).values)
 
 from decimal import Decimal
 
@@ -22,27 +24,12 @@ def to_serializable(obj):
         return [to_serializable(x) for x in obj]
     return obj
 
-import re
-
 def parse_vol(size_str, places):
     if not size_str or not places: return 0.0
-    try:
-        # Find all numbers (including floats) in the string
-        numbers = [float(n) for n in re.findall(r"(\d+(?:\.\d+)?)", size_str.replace(',', '.'))]
-        if len(numbers) >= 3:
-            # Smart Unit Detection:
-            # If the raw product is large (e.g. 40*40*40 = 64000), it's CM.
-            # If it's small (e.g. 0.4*0.4*0.4 = 0.064), it's Meters.
-            raw_box_vol = numbers[0] * numbers[1] * numbers[2]
-            
-            # 10 is a safe threshold (10x10x10cm = 1000cm³; 2x2x2m = 8m³)
-            if raw_box_vol > 10.0:
-                return round((raw_box_vol * places) / 1_000_000.0, 4)
-            else:
-                return round(raw_box_vol * places, 4)
-    except Exception as e:
-        print(f"Error parsing volume from '{size_str}': {e}")
-    return 0.0
+    dims = dimensions.parse_dimensions(size_str)
+    if dims is None:
+        return 0.0
+    return dims.volume_m3(places)
 
 def recalculate_product_costs(product_obj: models.Product):
     """
@@ -76,7 +63,15 @@ def recalculate_product_costs(product_obj: models.Product):
     # 6. Final Cost
     product_obj.final_cost = round(product_obj.product_cost_kgs + product_obj.delivery_cost_kgs + product_obj.service_fee, 2)
 
-    # 7. Total Volume
+    # 7. Package dimensions (cm) and Total Volume
+    dims = dimensions.parse_dimensions(product_obj.packaging_size)
+    if dims is not None:
+        product_obj.package_length, product_obj.package_width, product_obj.package_height = dims.cm
+        product_obj.package_unit = dims.unit
+    else:
+        product_obj.package_length = product_obj.package_width = product_obj.package_height = None
+        product_obj.package_unit = None
+
     # Use packaging_size if available, otherwise fallback to existing total_volume if it was manually set
     calc_vol = parse_vol(product_obj.packaging_size, places_count)
     if calc_vol > 0:
@@ -106,33 +101,106 @@ def create_product(db: Session, product: schemas.ProductCreate, user_id: int):
     recalculate_product_costs(db_product)
     
     db.add(db_product)
-    db.commit()
-    db.refresh(db_product)
+    # Flush for the id; product, rollups and audit row then commit together
+    db.flush()
     
+    rollups.apply_change(db, after=rollups.snapshot(db_product))
+
     # Audit log
-    log = models.AuditLog(
-        user_id=user_id,
-        product_id=db_product.id,
-        action="Created Product",
-        details={"after": to_serializable(product.dict())}
-    )
-    db.add(log)
+    audit.record(db, user_id, db_product.id, "Created Product", {"after": audit.column_values(db_product)})
+    # Single commit; every column value is already on the instance, so no refresh SELECT
     db.commit()
     
     return db_product
 
-def get_products(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Product).order_by(models.Product.id.desc()).offset(skip).limit(limit).all()
+def _product_query(db: Session, columns=None):
+    query = db.query(models.Product)
+    if columns:
+        # Only hydrate the requested columns; the primary key is always loaded
+        query = query.options(load_only(*(getattr(models.Product, c) for c in columns)))
+    return query
+
+def get_products(db: Session, skip: int = 0, limit: int = 100, columns=None):
+    return _product_query(db, columns).order_by(models.Product.id.desc()).offset(skip).limit(limit).all()
+
+import base64
+
+def encode_cursor(product_obj: models.Product) -> str:
+    """
+    Opaque keyset cursor pointing just past the given product.
+    Only `id` is used for seeking (primary key index); `updated_at` is carried
+    along so clients can tell whether the row changed since the page was read.
+    """
+    payload = {"id": product_obj.id, "updated_at": to_serializable(product_obj.updated_at)}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> int:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return int(payload["id"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def cursor_columns(columns):
+    """A page's column set plus what encode_cursor reads, so it isn't lazy-loaded per page."""
+    return tuple(dict.fromkeys((*columns, "updated_at"))) if columns else columns
+
+def get_products_page(db: Session, cursor: str = None, limit: int = 100, columns=None):
+    """
+    Keyset pagination over products, newest first.
+    Seeks with `id < last_id` instead of OFFSET so every page costs the same
+    regardless of depth, and concurrent inserts don't shift rows between pages.
+    """
+    query = _product_query(db, cursor_columns(columns))
+    if cursor:
+        query = query.filter(models.Product.id < decode_cursor(cursor))
+    # Fetch one extra row to know whether another page exists
+    rows = query.order_by(models.Product.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    items = rows[:limit]
+    next_cursor = encode_cursor(items[-1]) if has_more else None
+    return {"items": items, "next_cursor": next_cursor, "has_more": has_more}
+
+def iter_product_rows(db: Session, batch_size: int = 500):
+    """
+    Stream every product as a plain row mapping, oldest first, in batches.
+    Uses a server-side cursor (yield_per implies stream_results) and Core rows
+    instead of ORM objects, so memory stays flat regardless of catalog size.
+    """
+    stmt = select(*models.Product.__table__.columns).order_by(models.Product.id)
+    result = db.execute(stmt.execution_options(yield_per=batch_size))
+    for partition in result.mappings().partitions():
+        yield partition
 
 def get_product(db: Session, product_id: int):
     return db.query(models.Product).filter(models.Product.id == product_id).first()
 
+def get_products_fingerprint(db: Session):
+    """
+    (row count, max id, max updated_at) in a single aggregate query.
+    Inserts and updates move max(id)/max(updated_at); deletes change the count.
+    """
+    return db.query(
+        func.count(models.Product.id),
+        func.max(models.Product.id),
+        func.max(models.Product.updated_at),
+    ).one()
+
+def get_product_updated_at(db: Session, product_id: int):
+    """Returns (exists, updated_at) without loading the row."""
+    row = db.query(models.Product.updated_at).filter(models.Product.id == product_id).first()
+    if row is None:
+        return False, None
+    return True, row[0]
+
 def update_product(db: Session, product_id: int, product_update: schemas.ProductUpdate, user_id: int):
     db_product = get_product(db, product_id)
     if not db_product:
         return None
     
-    old_data = {c.name: to_serializable(getattr(db_product, c.name)) for c in db_product.__table__.columns}
+    old_data = audit.column_values(db_product)
+    old_rollup = rollups.snapshot(db_product)
     
     update_data = product_update.dict(exclude_unset=True)
     for key, value in update_data.items():
@@ -141,18 +209,13 @@ def update_product(db: Session, product_id: int, product_update: schemas.Product
     # Always recalculate on update to ensure source of truth
     recalculate_product_costs(db_product)
 
-    db.commit()
-    db.refresh(db_product)
+    db.flush()
     
+    rollups.apply_change(db, before=old_rollup, after=rollups.snapshot(db_product))
+
     # Audit log
-    new_data = {c.name: to_serializable(getattr(db_product, c.name)) for c in db_product.__table__.columns}
-    log = models.AuditLog(
-        user_id=user_id,
-        product_id=db_product.id,
-        action="Updated Product",
-        details={"before": old_data, "after": new_data}
-    )
-    db.add(log)
+    changes = audit.diff(old_data, audit.column_values(db_product))
+    audit.record(db, user_id, db_product.id, "Updated Product", {"changes": changes})
     db.commit()
     
     return db_product
@@ -162,25 +225,330 @@ def delete_product(db: Session, product_id: int, user_id: int):
         return False
     
     # Capture data for audit log before deletion
-    old_data = {c.name: to_serializable(getattr(db_product, c.name)) for c in db_product.__table__.columns}
+    old_data = audit.column_values(db_product)
+    old_rollup = rollups.snapshot(db_product)
     
     db.delete(db_product)
-    db.commit()
     
+    rollups.apply_change(db, before=old_rollup)
+
     # Audit log
-    log = models.AuditLog(
-        user_id=user_id,
-        product_id=None, # Product is gone
-        action="Deleted Product",
-        details={"before": old_data, "id": product_id}
-    )
-    db.add(log)
+    audit.record(db, user_id, None, "Deleted Product", {"before": old_data, "id": product_id}) # Product is gone
     db.commit()
     
     return True
 
+def append_media_urls(db: Session, product_id: int, urls, user_id: int):
+    """
+    Append URLs to a product's media_urls in one audited transaction.
+    The row is locked (SELECT ... FOR UPDATE on Postgres) so concurrent
+    appends don't overwrite each other. Returns the product, or None.
+    """
+    db_product = db.query(models.Product).filter(models.Product.id == product_id).with_for_update().first()
+    if not db_product:
+        return None
+    existing = list(db_product.media_urls or [])
+    added = [u for u in dict.fromkeys(urls) if u not in existing]
+    if not added:
+        return db_product
+
+    old_data = audit.column_values(db_product)
+    db_product.media_urls = existing + added
+    db.flush()
+    changes = audit.diff(old_data, audit.column_values(db_product))
+    audit.record(db, user_id, db_product.id, "Updated Product", {"changes": changes})
+    db.commit()
+    return db_product
+
+def get_product_state_at(db: Session, product_id: int, at: datetime):
+    """
+    Column values of a product as they were at `at` (naive UTC), or None if it
+    didn't exist then. Starts from the current row - or, for a deleted product,
+    from the snapshot in its delete entry - and undoes the audited changes
+    made after `at`, newest first. Raises ValueError when `at` is older than
+    the history audit_retention kept (archived or compacted entries).
+    """
+    archived_until = audit_retention.archived_until(db)
+    if archived_until is not None and at < archived_until:
+        raise ValueError(f"Audit history before {archived_until.isoformat()} has been archived")
+
+    db_product = get_product(db, product_id)
+    if db_product is not None:
+        state = to_serializable(audit.column_values(db_product))
+    else:
+        # Delete entries can't reference the removed row; the id is in their details
+        A = models.AuditLog
+        deleted = db.query(A.timestamp, A.details).filter(
+            A.action == "Deleted Product",
+            A.product_id.is_(None),
+            A.details["id"].as_integer() == product_id,
+        ).order_by(A.timestamp.desc(), A.id.desc()).first()
+        if deleted is None or deleted.timestamp <= at:
+            return None
+        state = dict(deleted.details["before"])
+
+    logs = db.query(models.AuditLog.action, models.AuditLog.details, models.AuditLog.timestamp).filter(
+        models.AuditLog.product_id == product_id,
+        models.AuditLog.timestamp > at,
+    ).order_by(models.AuditLog.timestamp.desc(), models.AuditLog.id.desc())
+    for action, details, timestamp in logs:
+        if action == "Created Product":
+            return None
+        details = details or {}
+        merged_since = details.get("merged_since")
+        if merged_since and datetime.fromisoformat(merged_since) <= at:
+            raise ValueError(f"Audit history from {merged_since} to {timestamp.isoformat()} has been compacted")
+        if "changes" in details:
+            for field, (old, _new) in details["changes"].items():
+                state[field] = old
+        elif "before" in details:
+            # Entries written before diff-only audit carry full snapshots
+            state.update(details["before"])
+
+    # Products created without an audit entry (bulk import, legacy data)
+    created_at = state.get("created_at")
+    if created_at and datetime.fromisoformat(created_at) > at:
+        return None
+    return state
+
+def apply_batch(db: Session, operations, user_id: int):
+    """
+    Apply create/update/delete operations in one transaction with a single flush.
+    Operations that can't apply (unknown id) are reported per item and skipped;
+    everything else commits together, with audit rows written in one bulk insert.
+    Returns one result dict per operation, in input order.
+    """
+    update_ids = {op.id for op in operations if op.op in ("update", "delete")}
+    existing = {}
+    if update_ids:
+        existing = {p.id: p for p in db.query(models.Product).filter(models.Product.id.in_(update_ids)).all()}
+
+    results = []
+    # (result, product, action, before) for audit rows, filled in after the flush
+    staged = []
+    rollup_changes = []
+    try:
+        for index, op in enumerate(operations):
+            result = {"index": index, "op": op.op, "ok": True, "id": getattr(op, "id", None), "error": None}
+            results.append(result)
+
+            if op.op == "create":
+                db_product = models.Product(**op.data.dict())
+                recalculate_product_costs(db_product)
+                db.add(db_product)
+                staged.append((result, db_product, "Created Product", None))
+                continue
+
+            db_product = existing.get(op.id)
+            if db_product is None:
+                result.update(ok=False, error="Product not found")
+                continue
+
+            before = audit.column_values(db_product)
+            before_rollup = rollups.snapshot(db_product)
+            if op.op == "update":
+                for key, value in op.data.dict(exclude_unset=True).items():
+                    setattr(db_product, key, value)
+                recalculate_product_costs(db_product)
+                staged.append((result, db_product, "Updated Product", before))
+                rollup_changes.append((before_rollup, rollups.snapshot(db_product)))
+            else:
+                db.delete(db_product)
+                del existing[op.id]
+                staged.append((result, None, "Deleted Product", before))
+                rollup_changes.append((before_rollup, None))
+
+        db.flush()
+
+        audit_rows = []
+        for result, db_product, action, before in staged:
+            if action == "Created Product":
+                result["id"] = db_product.id
+                rollup_changes.append((None, rollups.snapshot(db_product)))
+                details = {"after": audit.column_values(db_product)}
+                product_id = db_product.id
+            elif action == "Updated Product":
+                details = {"changes": audit.diff(before, audit.column_values(db_product))}
+                product_id = db_product.id
+            else:
+                details = {"before": before, "id": result["id"]}
+                product_id = None # Product is gone
+            audit_rows.append(audit.make_event(user_id, product_id, action, details))
+
+        rollups.apply_changes(db, rollup_changes)
+        audit.record_many(db, audit_rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return results
+
+def month_bucket(db: Session, column):
+    """SQL expression formatting a timestamp column as 'YYYY-MM' for the current dialect."""
+    if db.get_bind().dialect.name == "sqlite":
+        return func.strftime("%Y-%m", column)
+    return func.to_char(func.date_trunc("month", column), "YYYY-MM")
+
+def _analytics_filters(query, date_from=None, date_to=None, supplier=None):
+    if date_from:
+        query = query.filter(models.Product.created_at >= date_from)
+    if date_to:
+        query = query.filter(models.Product.created_at < date_to)
+    if supplier:
+        query = query.filter(models.Product.supplier_name == supplier)
+    return query
+
+def get_analytics_summary(db: Session, date_from: datetime = None, date_to: datetime = None, supplier: str = None):
+    """
+    Dashboard aggregates computed with GROUP BY in the database.
+    Each section is one grouped query over `products`; nothing is loaded row by row.
+    """
+    P = models.Product
+    filtered = lambda q: _analytics_filters(q, date_from, date_to, supplier)
+
+    totals = filtered(db.query(
+        func.count(P.id),
+        func.coalesce(func.sum(P.final_cost), 0.0),
+        func.coalesce(func.sum(P.outstanding_balance), 0.0),
+    )).one()
+
+    by_status = filtered(db.query(P.status, func.count(P.id))).group_by(P.status).all()
+    by_payment = filtered(db.query(P.payment_status, func.count(P.id))).group_by(P.payment_status).all()
+
+    by_method = filtered(db.query(
+        P.shipping_method,
+        func.count(P.id),
+        func.coalesce(func.sum(P.weight_kg), 0.0),
+        func.coalesce(func.sum(P.total_weight), 0.0),
+        func.coalesce(func.sum(P.total_volume), 0.0),
+    )).group_by(P.shipping_method).all()
+
+    month = month_bucket(db, P.created_at).label("month")
+    monthly = filtered(db.query(
+        month,
+        func.count(P.id),
+        func.coalesce(func.sum(P.final_cost), 0.0),
+        func.coalesce(func.sum(func.coalesce(P.product_cost_kgs, 0.0) + func.coalesce(P.delivery_cost_kgs, 0.0)), 0.0),
+        func.coalesce(func.sum(P.outstanding_balance), 0.0),
+    )).filter(P.created_at.isnot(None)).group_by(month).order_by(month).all()
+
+    return {
+        "count": totals[0],
+        "final_cost": totals[1],
+        "outstanding_balance": totals[2],
+        "by_status": [{"status": s, "count": c} for s, c in by_status],
+        "by_payment_status": [{"payment_status": s, "count": c} for s, c in by_payment],
+        "by_shipping_method": [
+            {"shipping_method": m, "count": c, "weight_kg": w, "total_weight": tw, "total_volume": tv}
+            for m, c, w, tw, tv in by_method
+        ],
+        "monthly": [
+            {"month": m, "count": c, "final_cost": fc, "expenses": ex, "outstanding_balance": ob}
+            for m, c, fc, ex, ob in monthly
+        ],
+    }
+
 def get_users(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.User).offset(skip).limit(limit).all()
 
 def get_audit_logs(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.AuditLog).order_by(models.AuditLog.timestamp.desc()).offset(skip).limit(limit).all()
+
+def encode_audit_cursor(log: models.AuditLog) -> str:
+    payload = {"ts": to_serializable(log.timestamp), "id": log.id}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_audit_cursor(cursor: str):
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(payload["ts"]), int(payload["id"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def get_audit_logs_page(db: Session, cursor: str = None, limit: int = 100, product_id: int = None,
+                        user_id: int = None, action: str = None, date_from: datetime = None, date_to: datetime = None):
+    """
+    Keyset pagination over audit entries, newest first, ordered by (timestamp, id).
+    Scoped by product or user, each filter combination is served by one of the
+    composite audit_logs indexes.
+    """
+    A = models.AuditLog
+    query = db.query(A)
+    if product_id is not None:
+        query = query.filter(A.product_id == product_id)
+    if user_id is not None:
+        query = query.filter(A.user_id == user_id)
+    if action:
+        query = query.filter(A.action == action)
+    if date_from:
+        query = query.filter(A.timestamp >= date_from)
+    if date_to:
+        query = query.filter(A.timestamp <= date_to)
+    if cursor:
+        ts, last_id = decode_audit_cursor(cursor)
+        query = query.filter(or_(A.timestamp < ts, and_(A.timestamp == ts, A.id < last_id)))
+    rows = query.order_by(A.timestamp.desc(), A.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    items = rows[:limit]
+    next_cursor = encode_audit_cursor(items[-1]) if has_more else None
+    return {"items": items, "next_cursor": next_cursor, "has_more": has_more}
+
+def media_asset_result(asset: models.MediaAsset) -> dict:
+    return {
+        "url": asset.secure_url,
+        "public_id": asset.public_id,
+        "resource_type": asset.resource_type,
+        "format": asset.format or "",
+        "bytes": asset.bytes or 0,
+    }
+
+def use_cached_media(db: Session, sha256: str):
+    """Upload result for already-stored content (counting the hit), or None."""
+    asset = db.query(models.MediaAsset).filter(models.MediaAsset.sha256 == sha256).first()
+    if asset is None:
+        return None
+    # Increment in SQL so concurrent hits on the same asset aren't lost
+    db.query(models.MediaAsset).filter(models.MediaAsset.id == asset.id).update(
+        {models.MediaAsset.hit_count: models.MediaAsset.hit_count + 1, models.MediaAsset.last_used_at: datetime.utcnow()},
+        synchronize_session=False,
+    )
+    db.commit()
+    return media_asset_result(asset)
+
+def save_media_asset(db: Session, sha256: str, result: dict) -> dict:
+    """Remember a fresh Cloudinary upload. If the same content was stored meanwhile, that one wins."""
+    db.add(models.MediaAsset(
+        sha256=sha256,
+        secure_url=result["url"],
+        public_id=result["public_id"],
+        resource_type=result["resource_type"],
+        format=result.get("format") or None,
+        bytes=result.get("bytes") or 0,
+    ))
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        asset = db.query(models.MediaAsset).filter(models.MediaAsset.sha256 == sha256).first()
+        return media_asset_result(asset)
+    return result
+
+def get_media_cache_stats(db: Session) -> dict:
+    """Each stored asset is one miss (it went to Cloudinary); every reuse is a hit."""
+    A = models.MediaAsset
+    assets, hits, bytes_saved, bytes_uploaded = db.query(
+        func.count(A.id),
+        func.coalesce(func.sum(A.hit_count), 0),
+        func.coalesce(func.sum(A.hit_count * A.bytes), 0),
+        func.coalesce(func.sum(A.bytes), 0),
+    ).one()
+    lookups = hits + assets
+    return {
+        "assets": assets,
+        "hits": hits,
+        "misses": assets,
+        "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        "bytes_saved": bytes_saved,
+        "bytes_uploaded": bytes_uploaded,
+    }
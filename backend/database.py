@@ -1,8 +1,10 @@
-from sqlalchemy import create_engine
+from anyio import to_thread
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
 from dotenv import load_dotenv
+import serialization
 
 load_dotenv()
 
@@ -14,10 +16,68 @@ SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite:///{DB_PATH}")
 if SQLALCHEMY_DATABASE_URL and SQLALCHEMY_DATABASE_URL.startswith("postgres://"):
     SQLALCHEMY_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False} if "sqlite" in SQLALCHEMY_DATABASE_URL else {}
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Worker threads FastAPI runs sync endpoints on (set on the anyio limiter at startup).
+# Each of them may hold a session, so the pool is sized to serve all of them at once.
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "40"))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", str(max(THREADPOOL_SIZE - DB_POOL_SIZE, 0))))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Render/Supabase drop idle connections; recycle before they do
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+def _is_memory_sqlite(url: str) -> bool:
+    return url.split("?")[0].rstrip("/") in ("sqlite:", "sqlite+aiosqlite:") or ":memory:" in url
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        # WAL lets readers run alongside the single writer; NORMAL is durable in WAL mode
+        # except for the last transactions on power loss
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        # Negative cache_size is in KiB rather than pages
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    finally:
+        cursor.close()
+
+def engine_options(url: str) -> dict:
+    """create_engine keyword arguments for the given URL."""
+    # JSON columns go through orjson; it also handles datetimes and enums in audit details
+    json_options = {"json_serializer": serialization.dumps, "json_deserializer": serialization.loads}
+    if url.startswith("sqlite"):
+        options = {"connect_args": {"check_same_thread": False}, **json_options}
+        if not _is_memory_sqlite(url):
+            options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+        return options
+    return {
+        **json_options,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        # Replaces connections the server closed while the service was asleep
+        "pool_pre_ping": True,
+    }
+
+def configure_engine(sync_engine):
+    """Attach per-connection setup (SQLite pragmas) to an engine."""
+    if sync_engine.dialect.name == "sqlite":
+        event.listen(sync_engine, "connect", _set_sqlite_pragmas)
+    return sync_engine
+
+def create_db_engine(url: str = SQLALCHEMY_DATABASE_URL):
+    return configure_engine(create_engine(url, **engine_options(url)))
+
+engine = create_db_engine()
+# Instances stay loaded after commit: write paths return what they just flushed
+# instead of paying a SELECT per object to re-read it
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 Base = declarative_base()
 
@@ -27,3 +87,50 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Optional async data layer (ASYNC_DB=1): same database through aiosqlite / asyncpg
+ASYNC_DB_ENABLED = os.getenv("ASYNC_DB", "").lower() in ("1", "true", "yes")
+
+def async_database_url(url: str) -> str:
+    """Map a sync SQLAlchemy URL onto its async driver."""
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgresql:") or url.startswith("postgresql+psycopg2:"):
+        url = url.replace("postgresql+psycopg2:", "postgresql:", 1).replace("postgresql:", "postgresql+asyncpg:", 1)
+        # asyncpg takes `ssl`, not libpq's `sslmode` (Supabase URLs carry sslmode=require)
+        return url.replace("sslmode=", "ssl=")
+    return url
+
+async_engine = None
+AsyncSessionLocal = None
+
+if ASYNC_DB_ENABLED:
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+    _async_url = async_database_url(SQLALCHEMY_DATABASE_URL)
+    async_engine = create_async_engine(_async_url, **engine_options(_async_url))
+    configure_engine(async_engine.sync_engine)
+    # Objects stay usable after commit without an implicit (blocking) refresh
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+async def get_async_db():
+    if AsyncSessionLocal is None:
+        raise RuntimeError("Async database layer is disabled; set ASYNC_DB=1")
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_session():
+    """
+    Session for endpoints that serve both modes (see routers/products.py): an
+    AsyncSession with ASYNC_DB=1, otherwise a sync Session, closed in the
+    threadpool since closing it may talk to the database.
+    """
+    if ASYNC_DB_ENABLED:
+        async with AsyncSessionLocal() as db:
+            yield db
+        return
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        await to_thread.run_sync(db.close)
@@ -1,31 +1,53 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from sqlalchemy.orm import Session
-from database import get_db
-import models, schemas, auth
+from fastapi.concurrency import run_in_threadpool
+from database import SessionLocal
+import database
+import models, schemas, auth, user_cache, async_crud
 import os
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def _load_user_sync(username: str):
+    db = SessionLocal()
+    try:
+        return db.query(models.User).filter(models.User.username == username).first()
+    finally:
+        db.close()
+
+async def load_user(username: str):
+    """Fetch a user without blocking the event loop, via the async layer when enabled."""
+    if database.ASYNC_DB_ENABLED:
+        async with database.AsyncSessionLocal() as db:
+            return await async_crud.get_user_by_username(db, username)
+    return await run_in_threadpool(_load_user_sync, username)
+
+async def get_current_user(token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
+    payload = user_cache.token_cache.get(token)
+    if payload is None:
+        try:
+            payload = jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
+        except JWTError:
             raise credentials_exception
-        token_data = schemas.TokenData(username=username)
-    except JWTError:
+        user_cache.cache_token(token, payload)
+    username: str = payload.get("sub")
+    if username is None:
         raise credentials_exception
-    user = db.query(models.User).filter(models.User.username == token_data.username).first()
+    token_data = schemas.TokenData(username=username)
+
+    user = user_cache.user_cache.get(token_data.username)
+    if user is not None:
+        return user
+    user = await load_user(token_data.username)
     if user is None:
         raise credentials_exception
-    return user
+    return user_cache.cache_user(user)
 
 async def get_current_active_user(current_user: models.User = Depends(get_current_user)):
     return current_user
@@ -34,7 +56,8 @@ class RoleChecker:
     def __init__(self, allowed_roles: list[models.UserRole]):
         self.allowed_roles = allowed_roles
 
-    def __call__(self, user: models.User = Depends(get_current_active_user)):
+    # async: a plain check, no reason to take a threadpool slot for it
+    async def __call__(self, user: models.User = Depends(get_current_active_user)):
         if user.role not in self.allowed_roles and user.role != models.UserRole.ADMIN:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
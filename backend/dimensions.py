@@ -0,0 +1,81 @@
+"""
+Packaging size parsing ("50x40x30", "120,5 × 80 × 60 cm", "0.4*0.4*0.4", "500х400х300 мм").
+
+Grammar: three numbers (decimal point or comma) separated by x / × / * (Latin
+or Cyrillic х), each optionally followed by a unit (mm, cm, m, мм, см, м). A
+unit written only after the last number applies to all three. Sizes without
+any unit keep the historical guess: a box product above 10 is centimetres,
+otherwise metres. Strings that don't match the grammar fall back to the first
+three numbers found anywhere in them, as before.
+
+Results are memoized; catalogs repeat a small set of box sizes.
+"""
+import os
+import re
+from functools import lru_cache
+from typing import NamedTuple, Optional, Tuple
+
+DIMENSION_CACHE_SIZE = int(os.getenv("DIMENSION_CACHE_SIZE", "4096"))
+
+_NUMBER = r"(\d+(?:[.,]\d+)?)"
+_UNIT = r"(mm|cm|m|мм|см|м)?"
+_SEP = r"\s*[x×х*]\s*"
+_DIMENSIONS_RE = re.compile(
+    rf"^\s*{_NUMBER}\s*{_UNIT}{_SEP}{_NUMBER}\s*{_UNIT}{_SEP}{_NUMBER}\s*{_UNIT}\.?\s*$",
+    re.IGNORECASE,
+)
+_ANY_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+
+_UNIT_ALIASES = {"mm": "mm", "cm": "cm", "m": "m", "мм": "mm", "см": "cm", "м": "m"}
+_TO_CM = {"mm": 0.1, "cm": 1.0, "m": 100.0}
+# Divides length * width * height in the unit to get cubic metres
+_M3_DIVISOR = {"mm": 1_000_000_000.0, "cm": 1_000_000.0, "m": 1.0}
+
+# 10 is a safe threshold (10x10x10cm = 1000cm³; 2x2x2m = 8m³)
+_UNITLESS_CM_THRESHOLD = 10.0
+
+
+class Dimensions(NamedTuple):
+    length: float
+    width: float
+    height: float
+    unit: str  # "mm", "cm" or "m"; the unit length/width/height are in
+
+    @property
+    def cm(self) -> Tuple[float, float, float]:
+        factor = _TO_CM[self.unit]
+        return tuple(round(v * factor, 4) for v in (self.length, self.width, self.height))
+
+    def volume_m3(self, places: int = 1) -> float:
+        """Volume of `places` boxes in m³, rounded to 4 decimals."""
+        raw_box_vol = self.length * self.width * self.height
+        return round((raw_box_vol * places) / _M3_DIVISOR[self.unit], 4)
+
+
+def _guess_unit(numbers) -> str:
+    return "cm" if numbers[0] * numbers[1] * numbers[2] > _UNITLESS_CM_THRESHOLD else "m"
+
+
+@lru_cache(maxsize=DIMENSION_CACHE_SIZE)
+def parse_dimensions(text: Optional[str]) -> Optional[Dimensions]:
+    """Dimensions of a packaging size string, or None if it has fewer than three numbers."""
+    if not text:
+        return None
+    match = _DIMENSIONS_RE.match(text)
+    if match:
+        numbers = [float(match.group(i).replace(",", ".")) for i in (1, 3, 5)]
+        units = [_UNIT_ALIASES[u.lower()] if u else None for u in (match.group(i) for i in (2, 4, 6))]
+        if units[2] and not units[0] and not units[1]:
+            units = [units[2]] * 3
+        if not any(units):
+            return Dimensions(*numbers, _guess_unit(numbers))
+        if len(set(units)) == 1:
+            return Dimensions(*numbers, units[0])
+        # Mixed or partially given units: normalise to cm (a missing unit means cm)
+        in_cm = [n * _TO_CM[u or "cm"] for n, u in zip(numbers, units)]
+        return Dimensions(*in_cm, "cm")
+
+    numbers = [float(n) for n in _ANY_NUMBER_RE.findall(text.replace(",", "."))]
+    if len(numbers) < 3:
+        return None
+    return Dimensions(*numbers[:3], _guess_unit(numbers))
@@ -0,0 +1,51 @@
+"""
+Streaming product export (NDJSON / CSV).
+Rows are pulled from the database in batches and encoded one batch at a time,
+so the response starts immediately and memory use does not grow with the catalog.
+"""
+import csv
+import io
+from sqlalchemy.orm import Session
+import models, crud, serialization
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+EXPORT_COLUMNS = [c.name for c in models.Product.__table__.columns]
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    # JSON columns (media_urls, specifications) are embedded as JSON text
+    if isinstance(value, (dict, list)):
+        return serialization.dumps(value)
+    return value
+
+
+def iter_ndjson(db: Session, batch_size: int = 500):
+    for batch in crud.iter_product_rows(db, batch_size=batch_size):
+        yield "".join(serialization.dumps(dict(row)) + "\n" for row in batch)
+
+
+def iter_csv(db: Session, batch_size: int = 500):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # Header goes out before the first query returns
+    writer.writerow(EXPORT_COLUMNS)
+    yield buffer.getvalue()
+    for batch in crud.iter_product_rows(db, batch_size=batch_size):
+        buffer.seek(0)
+        buffer.truncate()
+        for row in batch:
+            serializable = crud.to_serializable(dict(row))
+            writer.writerow([_csv_value(serializable[c]) for c in EXPORT_COLUMNS])
+        yield buffer.getvalue()
+
+
+def iter_export(db: Session, fmt: str, batch_size: int = 500):
+    if fmt == "csv":
+        return iter_csv(db, batch_size)
+    return iter_ndjson(db, batch_size)
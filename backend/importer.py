@@ -0,0 +1,161 @@
+"""
+Bulk product import from supplier spreadsheets (CSV / Excel).
+
+Rows are read in chunks, validated against schemas.ProductCreate, costed
+column-wise by cost_engine and inserted with one executemany per chunk.
+The whole import is a single transaction.
+
+CLI: python importer.py manifest.xlsx --user admin [--dry-run] [--atomic]
+"""
+import os
+from datetime import datetime
+import pandas as pd
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+import models, schemas, cost_engine, rollups, audit
+
+CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+
+PRODUCT_FIELDS = set(schemas.ProductCreate.model_fields)
+
+
+def _normalize_header(name) -> str:
+    return str(name).strip().lower().replace(" ", "_").replace("-", "_")
+
+
+def read_chunks(source, filename: str, chunk_size: int = CHUNK_SIZE):
+    """
+    Yield DataFrames of at most `chunk_size` rows. CSV is streamed by pandas;
+    Excel workbooks are loaded once (openpyxl has no chunked reader) and sliced.
+    """
+    if filename.lower().endswith((".xlsx", ".xlsm", ".xls")):
+        frame = pd.read_excel(source, dtype=object)
+        for start in range(0, len(frame), chunk_size):
+            yield frame.iloc[start:start + chunk_size]
+    else:
+        yield from pd.read_csv(source, dtype=object, chunksize=chunk_size, skipinitialspace=True)
+
+
+def _is_missing(value) -> bool:
+    # NaN, NaT (blank Excel date/time cells) and None alike
+    return value is None or (pd.api.types.is_scalar(value) and pd.isna(value))
+
+
+def _row_payload(record: dict) -> dict:
+    # Empty cells are dropped so ProductCreate defaults apply
+    payload = {}
+    for key, value in record.items():
+        if _is_missing(value):
+            continue
+        if isinstance(value, str):
+            value = value.strip()
+            if value == "":
+                continue
+        payload[key] = value
+    return payload
+
+
+def _format_errors(exc: ValidationError):
+    return [
+        {"field": ".".join(str(p) for p in err["loc"]), "message": err["msg"]}
+        for err in exc.errors()
+    ]
+
+
+def _costed_rows(products):
+    """ProductCreate list -> insert-ready dicts with calculated fields filled in."""
+    rows = [p.model_dump() for p in products]
+    # A total_volume from the file is kept when packaging_size doesn't parse, as in crud.create_product
+    columns = {c: [None if _is_missing(r.get(c)) else r.get(c) for r in rows] for c in cost_engine.INPUT_COLUMNS}
+    costs = cost_engine.compute_costs(columns)
+    now = datetime.utcnow()
+    for i, row in enumerate(rows):
+        for name in cost_engine.OUTPUT_COLUMNS:
+            row[name] = cost_engine.to_python(costs[name][i])
+        row["created_at"] = now
+        row["updated_at"] = now
+    return rows
+
+
+def import_products(db: Session, source, filename: str, user_id: int,
+                    dry_run: bool = False, atomic: bool = False, chunk_size: int = CHUNK_SIZE):
+    """
+    Validate and insert every row of the spreadsheet.
+    Invalid rows are reported and skipped; with `atomic=True` any invalid row
+    aborts the whole import. Returns a dict matching schemas.ImportResult.
+    """
+    total_rows = 0
+    inserted = 0
+    errors = []
+    ignored_columns = set()
+    pending_rollups = []
+
+    try:
+        for chunk in read_chunks(source, filename, chunk_size):
+            chunk = chunk.rename(columns=_normalize_header)
+            ignored_columns.update(c for c in chunk.columns if c not in PRODUCT_FIELDS)
+            known = [c for c in chunk.columns if c in PRODUCT_FIELDS]
+
+            valid = []
+            for offset, record in enumerate(chunk[known].to_dict("records")):
+                # +2: header is spreadsheet row 1 and rows are 1-based
+                row_number = total_rows + offset + 2
+                try:
+                    valid.append(schemas.ProductCreate(**_row_payload(record)))
+                except ValidationError as e:
+                    errors.append({"row": row_number, "errors": _format_errors(e)})
+            total_rows += len(chunk)
+
+            if dry_run or (atomic and errors) or not valid:
+                continue
+
+            rows = _costed_rows(valid)
+            db.execute(insert(models.Product), rows)
+            pending_rollups.extend((None, rollups.snapshot(r)) for r in rows)
+            inserted += len(rows)
+
+        if dry_run or (atomic and errors):
+            db.rollback()
+            inserted = 0
+        elif inserted:
+            rollups.apply_changes(db, pending_rollups)
+            audit.record(db, user_id, None, "Imported Products",
+                         {"filename": filename, "inserted": inserted, "rejected": len(errors)})
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return {
+        "total_rows": total_rows,
+        "inserted": inserted,
+        "errors": errors,
+        "ignored_columns": sorted(ignored_columns),
+        "dry_run": dry_run,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Import products from a CSV/Excel manifest.")
+    parser.add_argument("path")
+    parser.add_argument("--user", default="admin", help="Username recorded in the audit log")
+    parser.add_argument("--dry-run", action="store_true", help="Validate only, insert nothing")
+    parser.add_argument("--atomic", action="store_true", help="Insert nothing if any row is invalid")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        user = db.query(models.User).filter(models.User.username == args.user).first()
+        if user is None:
+            raise SystemExit(f"Unknown user: {args.user}")
+        with open(args.path, "rb") as fh:
+            result = import_products(db, fh, os.path.basename(args.path), user.id,
+                                     dry_run=args.dry_run, atomic=args.atomic)
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+    finally:
+        db.close()
@@ -1,13 +1,11 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from database import engine, Base, SessionLocal
-import models, auth
-from routers import auth as auth_router, products as products_router, settings as settings_router, upload as upload_router
+from anyio import to_thread
+from database import engine, SessionLocal, THREADPOOL_SIZE
+import models, auth, search, rollups, settings_service, audit, upload_sessions
+from routers import auth as auth_router, products as products_router, settings as settings_router, upload as upload_router, analytics as analytics_router
 from migrate import migrate
 
-# Create tables
-Base.metadata.create_all(bind=engine)
-
 app = FastAPI(
     title="Logistics Management System",
     description="API for managing logistics products, orders, and media uploads.",
@@ -29,17 +27,27 @@ app.include_router(auth_router.router)
 app.include_router(products_router.router)
 app.include_router(settings_router.router)
 app.include_router(upload_router.router)
+app.include_router(analytics_router.router)
+
+@app.on_event("startup")
+async def configure_threadpool():
+    # Sync endpoints run on anyio's default limiter; keep it in step with the DB pool size
+    to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
 
 @app.on_event("startup")
 def startup_event():
     print("STARTUP: Initializing application...")
-    # Run migrations once on startup
+    # Creates tables and applies pending schema steps; a single query when up to date
     try:
         print("STARTUP: Running migrations...")
         migrate()
         print("STARTUP: Migrations completed.")
     except Exception as e:
-        print(f"STARTUP ERROR: Migration failed: {e}")
+        # Nothing else creates the tables, so don't start serving without them
+        print(f"STARTUP ERROR: Migration failed, refusing to start: {e}")
+        raise
+
+    search.load_search_backend(engine)
     
     db = SessionLocal()
     # Create seed users for different roles
@@ -50,18 +58,24 @@ def startup_event():
         {"username": "logistics", "email": "logistics@company.com", "role": models.UserRole.LOGISTICS, "password": "logistics123"},
     ]
     
-    for u_data in seed_users:
+    existing_usernames = {
+        username for (username,) in db.query(models.User.username)
+        .filter(models.User.username.in_([u["username"] for u in seed_users])).all()
+    }
+    missing_users = [u for u in seed_users if u["username"] not in existing_usernames]
+    # Hash all missing seed passwords in parallel instead of one bcrypt at a time
+    hashes = auth.hash_passwords([u["password"] for u in missing_users]) if missing_users else []
+
+    for u_data, hashed_password in zip(missing_users, hashes):
         try:
-            existing = db.query(models.User).filter(models.User.username == u_data["username"]).first()
-            if not existing:
-                user = models.User(
-                    username=u_data["username"],
-                    email=u_data["email"],
-                    role=u_data["role"],
-                    hashed_password=auth.get_password_hash(u_data["password"])
-                )
-                db.add(user)
-                db.commit()
+            user = models.User(
+                username=u_data["username"],
+                email=u_data["email"],
+                role=u_data["role"],
+                hashed_password=hashed_password
+            )
+            db.add(user)
+            db.commit()
         except Exception as e:
             db.rollback()
             print(f"Error seeding user {u_data['username']}: {e}")
@@ -77,15 +91,38 @@ def startup_event():
         {"key": "usd_to_kgs", "value": 89.0, "description": "Exchange rate USD to KGS"}
     ]
     
+    seeded = False
     for s_data in default_settings:
         existing = db.query(models.GlobalSettings).filter(models.GlobalSettings.key == s_data["key"]).first()
         if not existing:
             setting = models.GlobalSettings(**s_data)
             db.add(setting)
+            seeded = True
     
+    if seeded:
+        settings_service.bump_version(db)
     db.commit()
+
+    try:
+        rollups.ensure_built(db)
+    except Exception as e:
+        db.rollback()
+        print(f"STARTUP ERROR: Rollup rebuild failed: {e}")
     db.close()
 
+    audit.sink.start()
+    # Drop upload sessions abandoned before the restart
+    upload_sessions.gc()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    # Write out audit events still buffered in memory
+    audit.sink.stop()
+
+@app.on_event("shutdown")
+async def close_http_clients():
+    await upload_router.close_http_client()
+
 @app.get("/")
 def read_root():
     return {"message": "Logistics Management System API"}
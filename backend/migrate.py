@@ -1,72 +1,320 @@
-import sqlite3
+"""
+Versioned schema migrations.
+
+schema_version has one row per applied step. migrate() counts the rows and
+returns straight away when every entry of STEPS is there, so on an
+up-to-date database startup costs a single query.
+
+When something is pending, workers take a lock - pg_advisory_lock for the
+whole run on Postgres, BEGIN IMMEDIATE (SQLite's write lock) around each
+transaction on SQLite - re-check which steps are recorded and apply the
+missing ones in order, recording each one in the transaction that finishes it. Steps are idempotent (columns and indexes are checked
+through the inspector first), so databases set up by the old ALTER-and-catch
+script or by create_all come under versioning without changes.
+
+A step is schema changes, run in one transaction, plus an optional backfill
+that updates rows in batches of MIGRATION_BATCH_SIZE and commits after each
+batch, so the app keeps serving while it runs. Backfill progress is kept in
+schema_backfill and read back under the lock before every batch, so each
+batch runs once even with several workers, and an interrupted backfill
+resumes where it stopped.
+
+To change the schema: update models.py and append a step. Never edit or
+reorder steps that have shipped.
+"""
+import json
 import os
+import time
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, bindparam, func, inspect, select, text
+from sqlalchemy.exc import OperationalError
+
+import models, dimensions, search
+from database import Base, engine
+
+MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "1000"))
+# Any constant works as long as every worker uses the same one
+PG_LOCK_KEY = 0x6C6F6769
+
+_metadata = MetaData()
+schema_version = Table(
+    "schema_version", _metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(200), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+# Last key handled by an unfinished backfill, JSON encoded
+schema_backfill = Table(
+    "schema_backfill", _metadata,
+    Column("version", Integer, primary_key=True),
+    Column("last_key", String(200), nullable=False),
+)
+
+
+class _transaction:
+    """BEGIN ... COMMIT on an AUTOCOMMIT connection. BEGIN IMMEDIATE takes SQLite's write lock up front."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.exec_driver_sql("BEGIN IMMEDIATE" if self.conn.dialect.name == "sqlite" else "BEGIN")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.exec_driver_sql("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+def add_columns(conn, model, columns):
+    """
+    Add model columns missing from its table. `columns` is a list of
+    (name, default) with default an SQL literal or None; the column type is
+    the model's, compiled for the connection's dialect.
+    """
+    table = model.__table__
+    quote = conn.dialect.identifier_preparer.quote
+    existing = {c["name"] for c in inspect(conn).get_columns(table.name)}
+    for name, default in columns:
+        if name in existing:
+            continue
+        column = table.c[name]
+        ddl = f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(name)} {column.type.compile(dialect=conn.dialect)}"
+        if default is not None:
+            ddl += f" DEFAULT {default}"
+            if not column.nullable:
+                ddl += " NOT NULL"
+        conn.exec_driver_sql(ddl)
+        print(f"Added column {table.name}.{name}")
+
+
+def create_indexes(conn, model):
+    for index in model.__table__.indexes:
+        index.create(bind=conn, checkfirst=True)
+
+
+def create_tables(conn, *tables):
+    for model in tables:
+        model.__table__.create(bind=conn, checkfirst=True)
+
+
+def _record(conn, version: int, name: str):
+    conn.execute(schema_version.insert().values(version=version, name=name, applied_at=datetime.utcnow()))
+
+
+def backfill(conn, version: int, name: str, run_batch) -> bool:
+    """
+    Call run_batch(conn, after) in a transaction of its own until it returns
+    None, then record the step in that same transaction. run_batch handles up
+    to MIGRATION_BATCH_SIZE rows after the key `after` (None at first) and
+    returns the last key it handled. Returns False when another worker
+    finished the backfill first.
+    """
+    batches = 0
+    while True:
+        with _transaction(conn):
+            if version in applied_versions(conn):
+                return False
+            saved = conn.execute(
+                select(schema_backfill.c.last_key).where(schema_backfill.c.version == version)
+            ).scalar()
+            after = run_batch(conn, None if saved is None else json.loads(saved))
+            if after is None:
+                conn.execute(schema_backfill.delete().where(schema_backfill.c.version == version))
+                _record(conn, version, name)
+                return True
+            if saved is None:
+                conn.execute(schema_backfill.insert().values(version=version, last_key=json.dumps(after)))
+            else:
+                conn.execute(
+                    schema_backfill.update().where(schema_backfill.c.version == version).values(last_key=json.dumps(after))
+                )
+        batches += 1
+        if batches % 10 == 0:
+            print(f"  {name}: {batches * MIGRATION_BATCH_SIZE} rows")
+
+
+def _product_columns(conn):
+    add_columns(conn, models.Product, [
+        ("media_urls", None),
+        ("characteristics", None),
+        ("price", "0.0"),
+        ("weight", None),
+        ("size", None),
+        ("packaging_size", None),
+        # Restructured input fields
+        ("price_cny", "0.0"),
+        ("cny_rate", "0.0"),
+        ("places_count", "0"),
+        ("weight_per_box", "0.0"),
+        ("delivery_rate_usd_per_kg", "0.0"),
+        ("usd_rate", "0.0"),
+        ("service_percent", "10.0"),
+        # Calculated fields
+        ("total_weight", "0.0"),
+        ("product_cost_kgs", "0.0"),
+        ("delivery_cost_usd", "0.0"),
+        ("delivery_cost_kgs", "0.0"),
+        ("service_fee", "0.0"),
+        ("final_cost", "0.0"),
+        ("total_volume", "0.0"),
+        ("density", "0.0"),
+        ("specifications", None),
+        # Legacy / compatibility
+        ("delivery_usd_per_kg", "0.0"),
+        ("total_cost_som", "0.0"),
+    ])
+
+
+def _settings_updated_at(conn):
+    add_columns(conn, models.GlobalSettings, [("updated_at", None)])
+
 
-def migrate():
+def _fill_null_quantities(conn, after):
+    P = models.Product.__table__
+    result = conn.execute(
+        P.update()
+        .where(P.c.id.in_(select(P.c.id).where(P.c.quantity.is_(None)).limit(MIGRATION_BATCH_SIZE).scalar_subquery()))
+        .values(quantity=0)
+    )
+    # Updated rows drop out of the filter, so no key is needed
+    return True if result.rowcount else None
+
+
+def _audit_indexes(conn):
+    create_indexes(conn, models.AuditLog)
+
+
+def _audit_archive(conn):
+    create_tables(conn, models.AuditLogArchive)
+
+
+def _package_columns(conn):
+    add_columns(conn, models.Product, [
+        ("package_length", None),
+        ("package_width", None),
+        ("package_height", None),
+        ("package_unit", None),
+    ])
+
+
+def _fill_package_dimensions(conn, after):
+    P = models.Product.__table__
+    query = (
+        select(P.c.id, P.c.packaging_size)
+        .where(P.c.package_unit.is_(None), P.c.packaging_size.isnot(None))
+        .order_by(P.c.id)
+        .limit(MIGRATION_BATCH_SIZE)
+    )
+    if after is not None:
+        query = query.where(P.c.id > after)
+    rows = conn.execute(query).all()
+    if not rows:
+        return None
+    updates = []
+    for product_id, packaging_size in rows:
+        dims = dimensions.parse_dimensions(packaging_size)
+        if dims:
+            length, width, height = dims.cm
+            updates.append({"pid": product_id, "l": length, "w": width, "h": height, "u": dims.unit})
+    if updates:
+        conn.execute(
+            P.update().where(P.c.id == bindparam("pid")).values(
+                package_length=bindparam("l"), package_width=bindparam("w"),
+                package_height=bindparam("h"), package_unit=bindparam("u"),
+            ),
+            updates,
+        )
+    return rows[-1][0]
+
+
+def _media_assets(conn):
+    create_tables(conn, models.MediaAsset)
+
+
+def _search_index(conn):
+    try:
+        search.create_search_index(conn)
+    except OperationalError as e:
+        # SQLite built without FTS5; search falls back to LIKE
+        print(f"Search index not created: {e}")
+
+
+# (version, name, schema changes, batched backfill or None). Append only.
+STEPS = [
+    (1, "products: restructured, calculated and legacy columns", _product_columns, None),
+    (2, "settings.updated_at", _settings_updated_at, None),
+    (3, "products.quantity NULL -> 0", None, _fill_null_quantities),
+    (4, "audit_logs indexes", _audit_indexes, None),
+    (5, "audit_log_archive table", _audit_archive, None),
+    (6, "products: parsed package dimensions", _package_columns, _fill_package_dimensions),
+    (7, "media_assets table", _media_assets, None),
+    (8, "products full-text search index", _search_index, None),
+]
+
+
+def applied_versions(conn) -> set:
+    if not inspect(conn).has_table("schema_version"):
+        return set()
+    return set(conn.execute(select(schema_version.c.version)).scalars())
+
+
+def _applied_count(bind) -> int:
+    """The startup check: one SELECT. A missing table just means nothing was applied yet."""
     try:
-        db_path = os.path.join(os.path.dirname(__file__), "logistics.db")
-        if not os.path.exists(db_path):
-            print(f"Database not found at {db_path}")
-            return
-
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-
-        # ... (columns list remains same)
-        columns_to_add = [
-            ("media_urls", "JSON"),
-            ("characteristics", "TEXT"),
-            ("price", "FLOAT DEFAULT 0.0 NOT NULL"),
-            ("weight", "FLOAT"),
-            ("size", "VARCHAR(100)"),
-            ("packaging_size", "VARCHAR(100)"),
-            
-            # New Restructured Input Fields
-            ("price_cny", "FLOAT DEFAULT 0.0"),
-            ("cny_rate", "FLOAT DEFAULT 0.0"),
-            ("places_count", "INTEGER DEFAULT 0"),
-            ("weight_per_box", "FLOAT DEFAULT 0.0"),
-            ("delivery_rate_usd_per_kg", "FLOAT DEFAULT 0.0"),
-            ("usd_rate", "FLOAT DEFAULT 0.0"),
-            ("service_percent", "FLOAT DEFAULT 10.0"),
-            
-            # Calculated Fields
-            ("total_weight", "FLOAT DEFAULT 0.0"),
-            ("product_cost_kgs", "FLOAT DEFAULT 0.0"),
-            ("delivery_cost_usd", "FLOAT DEFAULT 0.0"),
-            ("delivery_cost_kgs", "FLOAT DEFAULT 0.0"),
-            ("service_fee", "FLOAT DEFAULT 0.0"),
-            ("final_cost", "FLOAT DEFAULT 0.0"),
-            ("total_volume", "FLOAT DEFAULT 0.0"),
-            ("density", "FLOAT DEFAULT 0.0"),
-            
-            # Structured Data
-            ("specifications", "JSON"),
-            
-            # Legacy / Compatibility
-            ("delivery_usd_per_kg", "FLOAT DEFAULT 0.0"),
-            ("total_cost_som", "FLOAT DEFAULT 0.0")
-        ]
-
-        for col_name, col_type in columns_to_add:
-            try:
-                cursor.execute(f"ALTER TABLE products ADD COLUMN {col_name} {col_type}")
-                print(f"Added column {col_name}")
-            except sqlite3.OperationalError as e:
-                if "duplicate column name" in str(e):
-                    pass # Fine
-                else:
-                    print(f"Error adding column {col_name}: {e}")
-
-        # Ensure existing quantities are not NULL
+        with bind.connect() as conn:
+            return conn.execute(select(func.count()).select_from(schema_version)).scalar()
+    except Exception:
+        return 0
+
+
+def _apply_pending(conn) -> int:
+    with _transaction(conn):
+        _metadata.create_all(bind=conn)
+        # A new database gets the current schema at once; the steps then find nothing to add
+        if not applied_versions(conn):
+            Base.metadata.create_all(bind=conn)
+
+    applied = 0
+    for version, name, schema_changes, backfill_batch in STEPS:
+        started = time.perf_counter()
+        with _transaction(conn):
+            # Another worker may have applied it while this one waited for the lock
+            if version in applied_versions(conn):
+                continue
+            if schema_changes:
+                schema_changes(conn)
+            if not backfill_batch:
+                _record(conn, version, name)
+        if backfill_batch and not backfill(conn, version, name, backfill_batch):
+            continue
+        applied += 1
+        print(f"Migration {version} ({name}) applied in {time.perf_counter() - started:.2f}s")
+    return applied
+
+
+def migrate(bind=None) -> int:
+    """Apply every step not yet recorded in schema_version. Returns the number applied."""
+    bind = bind or engine
+    done = _applied_count(bind)
+    if done >= len(STEPS):
+        return 0
+
+    print(f"{done} of {len(STEPS)} schema steps applied, migrating...")
+    with bind.connect() as conn:
+        # Transactions are issued explicitly (see _transaction)
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        postgres = conn.dialect.name == "postgresql"
+        if postgres:
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": PG_LOCK_KEY})
         try:
-            cursor.execute("UPDATE products SET quantity = 0 WHERE quantity IS NULL")
-        except: pass
-
-        conn.commit()
-        conn.close()
-        print("Migration completed.")
-    except Exception as e:
-        print(f"CRITICAL: Migration failed: {e}")
+            applied = _apply_pending(conn)
+        finally:
+            if postgres:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": PG_LOCK_KEY})
+    print("Migration completed.")
+    return applied
+
 
 if __name__ == "__main__":
     migrate()
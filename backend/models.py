@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Enum, JSON, Text
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Enum, JSON, Text, UniqueConstraint, Index, LargeBinary
 from sqlalchemy.orm import relationship
 from database import Base
 import enum
@@ -38,6 +38,8 @@ class User(Base):
 
 class Product(Base):
     __tablename__ = "products"
+    # Generated values come back with the INSERT/UPDATE (RETURNING where supported)
+    __mapper_args__ = {"eager_defaults": True}
     
     id = Column(Integer, primary_key=True, index=True) # Product ID (auto-generated)
     product_name = Column(String, index=True)
@@ -78,6 +80,11 @@ class Product(Base):
     weight = Column(Float, nullable=True)
     size = Column(String(100), nullable=True)
     packaging_size = Column(String(100), nullable=True)
+    # Parsed from packaging_size on every recalculation (see dimensions.py); lengths in cm
+    package_length = Column(Float, nullable=True)
+    package_width = Column(Float, nullable=True)
+    package_height = Column(Float, nullable=True)
+    package_unit = Column(String(4), nullable=True) # Unit packaging_size was written in
     
     # Restructured Fields & Backend Calculations
     # Input Fields
@@ -110,12 +117,40 @@ class Product(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+class ProductRollup(Base):
+    """
+    Pre-aggregated product totals per (month, status, shipping method, supplier).
+    Maintained incrementally by crud write paths; `rollups.rebuild` repairs drift.
+    Key columns use '' instead of NULL so the unique constraint holds.
+    """
+    __tablename__ = "product_rollups"
+    __table_args__ = (
+        UniqueConstraint("month", "status", "shipping_method", "supplier_name", name="uq_product_rollups_key"),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    month = Column(String(7), nullable=False, index=True) # YYYY-MM of created_at
+    status = Column(String, nullable=False, default="")
+    shipping_method = Column(String, nullable=False, default="")
+    supplier_name = Column(String, nullable=False, default="")
+    count = Column(Integer, nullable=False, default=0)
+    final_cost = Column(Float, nullable=False, default=0.0)
+    total_weight = Column(Float, nullable=False, default=0.0)
+    total_volume = Column(Float, nullable=False, default=0.0)
+    outstanding_balance = Column(Float, nullable=False, default=0.0)
+
 class GlobalSettings(Base):
     __tablename__ = "settings"
     id = Column(Integer, primary_key=True, index=True)
     key = Column(String, unique=True, index=True)
     value = Column(JSON) # Store rates and formulas as JSON
     description = Column(String)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class SettingsVersion(Base):
+    """Single-row counter bumped on every settings change (see settings_service)."""
+    __tablename__ = "settings_version"
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
 
 class ExchangeRate(Base):
     __tablename__ = "exchange_rates"
@@ -127,6 +162,12 @@ class ExchangeRate(Base):
 
 class AuditLog(Base):
     __tablename__ = "audit_logs"
+    # Newest-first feeds seek on (timestamp, id), optionally scoped to a product or user
+    __table_args__ = (
+        Index("ix_audit_logs_product_ts", "product_id", "timestamp", "id"),
+        Index("ix_audit_logs_user_ts", "user_id", "timestamp", "id"),
+        Index("ix_audit_logs_ts", "timestamp", "id"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     product_id = Column(Integer, ForeignKey("products.id"), nullable=True)
@@ -136,3 +177,29 @@ class AuditLog(Base):
     
     user = relationship("User")
     product = relationship("Product")
+
+class AuditLogArchive(Base):
+    """Gzipped NDJSON batch of audit rows moved out of audit_logs by audit_retention."""
+    __tablename__ = "audit_log_archive"
+    id = Column(Integer, primary_key=True, index=True)
+    first_id = Column(Integer, nullable=False)
+    last_id = Column(Integer, nullable=False)
+    range_start = Column(DateTime, index=True)
+    range_end = Column(DateTime, index=True)
+    row_count = Column(Integer, nullable=False)
+    payload = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class MediaAsset(Base):
+    """Cloudinary asset keyed by the SHA-256 of its content, so repeat uploads reuse it."""
+    __tablename__ = "media_assets"
+    id = Column(Integer, primary_key=True, index=True)
+    sha256 = Column(String(64), unique=True, index=True, nullable=False)
+    secure_url = Column(String, nullable=False)
+    public_id = Column(String, nullable=False)
+    resource_type = Column(String(16), nullable=False)
+    format = Column(String(16))
+    bytes = Column(Integer, default=0)
+    hit_count = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,121 @@
+"""
+Catalog-wide recalculation of calculated product fields.
+
+Reads input columns in primary-key order, one chunk at a time, computes the
+outputs with cost_engine (NumPy) and writes back changed rows with a bulk
+UPDATE per chunk, committing after each chunk. Progress is checkpointed to a
+file so an interrupted run resumes after the last committed chunk.
+
+CLI: python recalc_engine.py [--chunk-size N] [--checkpoint PATH] [--restart]
+"""
+import os
+import time
+from datetime import datetime
+from sqlalchemy import select, update, func
+from sqlalchemy.orm import Session
+import models, cost_engine, rollups
+
+DEFAULT_CHUNK_SIZE = int(os.getenv("RECALC_CHUNK_SIZE", "2000"))
+DEFAULT_CHECKPOINT = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".recalc_checkpoint")
+
+
+def _read_checkpoint(path):
+    if path and os.path.exists(path):
+        with open(path) as fh:
+            content = fh.read().strip()
+            return int(content) if content else 0
+    return 0
+
+
+def _write_checkpoint(path, last_id):
+    if not path:
+        return
+    tmp = path + ".tmp"
+    with open(tmp, "w") as fh:
+        fh.write(str(last_id))
+    os.replace(tmp, path)
+
+
+def _changed(old, new):
+    if old is None or new is None:
+        return old is not new
+    return old != new
+
+
+def recalculate_chunk(db: Session, rows):
+    """Compute outputs for a list of row mappings and bulk-update the rows that changed."""
+    columns = {c: [r[c] for r in rows] for c in cost_engine.INPUT_COLUMNS}
+    costs = cost_engine.compute_costs(columns)
+    now = datetime.utcnow()
+
+    mappings = []
+    for i, row in enumerate(rows):
+        values = {name: cost_engine.to_python(costs[name][i]) for name in cost_engine.OUTPUT_COLUMNS}
+        if any(_changed(row[name], value) for name, value in values.items()):
+            mappings.append({"id": row["id"], "updated_at": now, **values})
+
+    if mappings:
+        db.execute(update(models.Product), mappings)
+    return len(mappings)
+
+
+def recalculate_all(db: Session, chunk_size: int = DEFAULT_CHUNK_SIZE, checkpoint_path: str = DEFAULT_CHECKPOINT,
+                    restart: bool = False, progress=print):
+    """
+    Recalculate every product. Returns (rows scanned, rows updated).
+    Rollups are rebuilt at the end because final_cost / volume may have moved.
+    """
+    P = models.Product
+    last_id = 0 if restart else _read_checkpoint(checkpoint_path)
+    total = db.query(func.count(P.id)).filter(P.id > last_id).scalar()
+    if last_id:
+        progress(f"Resuming after product ID {last_id}, {total} products left.")
+    else:
+        progress(f"Found {total} products to recalculate.")
+
+    input_columns = [P.id] + [getattr(P, c) for c in cost_engine.INPUT_COLUMNS] + \
+        [getattr(P, c) for c in cost_engine.OUTPUT_COLUMNS if c not in cost_engine.INPUT_COLUMNS]
+
+    scanned = updated = 0
+    started = time.monotonic()
+    while True:
+        rows = db.execute(
+            select(*input_columns).where(P.id > last_id).order_by(P.id).limit(chunk_size)
+        ).mappings().all()
+        if not rows:
+            break
+        updated += recalculate_chunk(db, rows)
+        db.commit()
+        scanned += len(rows)
+        last_id = rows[-1]["id"]
+        _write_checkpoint(checkpoint_path, last_id)
+
+        elapsed = time.monotonic() - started
+        rate = scanned / elapsed if elapsed > 0 else 0.0
+        progress(f"  {scanned}/{total} scanned, {updated} updated ({rate:,.0f} rows/s)")
+
+    buckets = rollups.rebuild(db)
+    progress(f"Rebuilt {buckets} rollup buckets.")
+    # Finished cleanly: next run starts from the beginning
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return scanned, updated
+
+
+if __name__ == "__main__":
+    import argparse
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Recalculate calculated fields for every product.")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT, help="Progress file used to resume")
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        scanned, updated = recalculate_all(db, chunk_size=args.chunk_size,
+                                           checkpoint_path=args.checkpoint, restart=args.restart)
+        print(f"Successfully recalculated {scanned} products ({updated} changed).")
+    finally:
+        db.close()
@@ -0,0 +1,180 @@
+"""
+Incrementally maintained product rollups (see models.ProductRollup).
+
+crud write paths take a `snapshot()` of a product before and after a change
+and pass both to `apply_change()`, which turns them into +/- deltas per bucket
+and upserts them. Trend queries then read O(buckets) rows instead of scanning
+products. Run `python rollups.py rebuild` to recompute everything from scratch.
+"""
+from collections import defaultdict
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+import models
+
+MEASURES = ("final_cost", "total_weight", "total_volume", "outstanding_balance")
+KEY_COLUMNS = ("month", "status", "shipping_method", "supplier_name")
+
+
+def _key_part(value):
+    if value is None:
+        return ""
+    return value.value if hasattr(value, "value") else str(value)
+
+
+def snapshot(product_obj):
+    """
+    (bucket key, measures) for a product, or None for a product that doesn't exist.
+    Accepts an ORM object or a plain column mapping (bulk paths).
+    """
+    if product_obj is None:
+        return None
+    if isinstance(product_obj, dict):
+        get = product_obj.get
+    else:
+        get = lambda name: getattr(product_obj, name)
+    created_at = get("created_at")
+    key = (
+        created_at.strftime("%Y-%m") if created_at else "",
+        _key_part(get("status")),
+        _key_part(get("shipping_method")),
+        _key_part(get("supplier_name")),
+    )
+    return key, {m: get(m) or 0.0 for m in MEASURES}
+
+
+def _accumulate(deltas, snap, sign):
+    if snap is None:
+        return
+    key, measures = snap
+    bucket = deltas[key]
+    bucket["count"] += sign
+    for m in MEASURES:
+        bucket[m] += sign * measures[m]
+
+
+def apply_change(db: Session, before=None, after=None):
+    """Move one product's contribution from `before` to `after` (either may be None)."""
+    apply_changes(db, [(before, after)])
+
+
+def apply_changes(db: Session, changes):
+    """Apply many (before, after) snapshot pairs, merged into one upsert per bucket."""
+    deltas = defaultdict(lambda: defaultdict(float))
+    for before, after in changes:
+        _accumulate(deltas, before, -1)
+        _accumulate(deltas, after, +1)
+    for key, delta in deltas.items():
+        if any(abs(v) > 1e-9 for v in delta.values()):
+            _upsert(db, key, delta)
+
+
+def _upsert(db: Session, key, delta):
+    table = models.ProductRollup.__table__
+    values = dict(zip(KEY_COLUMNS, key))
+    values["count"] = int(delta["count"])
+    values.update({m: delta[m] for m in MEASURES})
+
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(table).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(KEY_COLUMNS),
+            set_={c: table.c[c] + stmt.excluded[c] for c in ("count",) + MEASURES},
+        )
+        db.execute(stmt)
+        return
+
+    # Generic fallback: read-modify-write under a row lock
+    row = db.query(models.ProductRollup).filter_by(**dict(zip(KEY_COLUMNS, key))).with_for_update().first()
+    if row is None:
+        db.add(models.ProductRollup(**values))
+    else:
+        row.count += values["count"]
+        for m in MEASURES:
+            setattr(row, m, getattr(row, m) + values[m])
+
+
+def rebuild(db: Session):
+    """Recompute all rollups from products with one GROUP BY. Commits."""
+    import crud
+    # Product writes apply their rollup deltas in their own transaction. Block them
+    # until the rebuild commits, or a delta committed between the GROUP BY and the
+    # DELETE would be lost: Postgres takes a table lock, SQLite's write lock comes
+    # with the DELETE, which therefore runs before the GROUP BY.
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("LOCK TABLE products IN SHARE ROW EXCLUSIVE MODE"))
+    db.query(models.ProductRollup).delete()
+
+    P = models.Product
+    month = crud.month_bucket(db, P.created_at).label("month")
+    rows = db.query(
+        month, P.status, P.shipping_method, P.supplier_name,
+        func.count(P.id),
+        *(func.coalesce(func.sum(getattr(P, m)), 0.0) for m in MEASURES),
+    ).group_by(month, P.status, P.shipping_method, P.supplier_name).all()
+
+    # Different raw values (e.g. NULL and '') can collapse into one key
+    buckets = defaultdict(lambda: defaultdict(float))
+    for m_, status, method, supplier, count, *sums in rows:
+        key = (m_ or "", _key_part(status), _key_part(method), _key_part(supplier))
+        buckets[key]["count"] += count
+        for name, value in zip(MEASURES, sums):
+            buckets[key][name] += value
+
+    db.bulk_insert_mappings(models.ProductRollup, [
+        {**dict(zip(KEY_COLUMNS, key)), "count": int(v["count"]), **{m: v[m] for m in MEASURES}}
+        for key, v in buckets.items()
+    ])
+    db.commit()
+    return len(buckets)
+
+
+def ensure_built(db: Session):
+    """Populate rollups on first start after the table was introduced."""
+    if db.query(models.ProductRollup.id).first() is None and db.query(models.Product.id).first() is not None:
+        print("Rollups are empty, rebuilding...")
+        rebuild(db)
+
+
+def get_monthly_trends(db: Session, month_from=None, month_to=None, status=None, shipping_method=None, supplier=None):
+    R = models.ProductRollup
+    query = db.query(
+        R.month,
+        func.sum(R.count),
+        *(func.sum(getattr(R, m)) for m in MEASURES),
+    ).filter(R.month != "")
+    if month_from:
+        query = query.filter(R.month >= month_from)
+    if month_to:
+        query = query.filter(R.month <= month_to)
+    if status:
+        query = query.filter(R.status == _key_part(status))
+    if shipping_method:
+        query = query.filter(R.shipping_method == _key_part(shipping_method))
+    if supplier:
+        query = query.filter(R.supplier_name == supplier)
+    rows = query.group_by(R.month).having(func.sum(R.count) > 0).order_by(R.month).all()
+    return [
+        {"month": month, "count": count, **dict(zip(MEASURES, sums))}
+        for month, count, *sums in rows
+    ]
+
+
+if __name__ == "__main__":
+    import sys
+    from database import SessionLocal, engine, Base
+
+    if len(sys.argv) < 2 or sys.argv[1] != "rebuild":
+        print("Usage: python rollups.py rebuild")
+        sys.exit(1)
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        buckets = rebuild(db)
+        print(f"Rebuilt {buckets} rollup buckets.")
+    finally:
+        db.close()
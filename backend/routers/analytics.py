@@ -0,0 +1,39 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from datetime import datetime
+import models, schemas, crud, dependencies, rollups
+from database import get_db
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+@router.get("/summary", response_model=schemas.AnalyticsSummary)
+def get_summary(
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    supplier: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(dependencies.get_current_active_user)
+):
+    """
+    Counts by status/payment status, weight and volume by shipping method and
+    monthly cost totals, optionally limited to a created_at range [date_from, date_to)
+    and a single supplier.
+    """
+    return crud.get_analytics_summary(db, date_from=date_from, date_to=date_to, supplier=supplier)
+
+@router.get("/trends", response_model=List[schemas.MonthlyTrend])
+def get_trends(
+    month_from: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$"),
+    month_to: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$"),
+    status: Optional[models.CargoStatus] = None,
+    shipping_method: Optional[models.ShippingMethod] = None,
+    supplier: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(dependencies.get_current_active_user)
+):
+    """Monthly totals read from the rollup table (cost does not grow with the catalog)."""
+    return rollups.get_monthly_trends(
+        db, month_from=month_from, month_to=month_to,
+        status=status, shipping_method=shipping_method, supplier=supplier,
+    )
@@ -1,17 +1,64 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from datetime import timedelta
 from typing import List
-import models, schemas, auth, dependencies, crud
-from database import get_db
+import models, schemas, auth, dependencies, crud, async_crud
+import database
+from database import get_db, SessionLocal
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
+def _load_login_user(username: str):
+    """(id, username, role, hashed_password) or None. Runs in a worker thread with a session of its own."""
+    db = SessionLocal()
+    try:
+        return db.query(
+            models.User.id, models.User.username, models.User.role, models.User.hashed_password
+        ).filter(models.User.username == username).first()
+    finally:
+        db.close()
+
+def _store_password_hash(user_id: int, old_hash: str, new_hash: str):
+    db = SessionLocal()
+    try:
+        # Skip it if the password changed while the new hash was computed
+        db.query(models.User).filter(
+            models.User.id == user_id, models.User.hashed_password == old_hash
+        ).update({"hashed_password": new_hash}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+async def _authenticate(form_data: OAuth2PasswordRequestForm):
+    """Returns token claims for valid credentials, upgrading stale password hashes on the way."""
+    if not database.ASYNC_DB_ENABLED:
+        # Only the short DB calls take a threadpool slot; bcrypt is awaited on the
+        # loop, so a burst of logins can't fill the threadpool with idle waiters
+        user = await run_in_threadpool(_load_login_user, form_data.username)
+        if not user or not await auth.verify_password_async(form_data.password, user.hashed_password):
+            return None
+        if auth.needs_rehash(user.hashed_password):
+            # BCRYPT_ROUNDS changed since this hash was made; upgrade it transparently
+            new_hash = await auth.get_password_hash_async(form_data.password)
+            await run_in_threadpool(_store_password_hash, user.id, user.hashed_password, new_hash)
+        return {"sub": user.username, "role": user.role}
+
+    async with database.AsyncSessionLocal() as db:
+        user = await async_crud.get_user_by_username(db, form_data.username)
+        if not user or not await auth.verify_password_async(form_data.password, user.hashed_password):
+            return None
+        claims = {"sub": user.username, "role": user.role}
+        if auth.needs_rehash(user.hashed_password):
+            user.hashed_password = await auth.get_password_hash_async(form_data.password)
+            await db.commit()
+        return claims
+
 @router.post("/token", response_model=schemas.Token)
-async def login_for_access_token(db: Session = Depends(get_db), form_data: OAuth2PasswordRequestForm = Depends()):
-    user = db.query(models.User).filter(models.User.username == form_data.username).first()
-    if not user or not auth.verify_password(form_data.password, user.hashed_password):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
+    claims = await _authenticate(form_data)
+    if claims is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -19,7 +66,7 @@ async def login_for_access_token(db: Session = Depends(get_db), form_data: OAuth
         )
     access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = auth.create_access_token(
-        data={"sub": user.username, "role": user.role}, expires_delta=access_token_expires
+        data=claims, expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
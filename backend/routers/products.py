@@ -1,15 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, Response, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
-import models, schemas, crud, dependencies
-from database import get_db
+from typing import Any, List, Optional
+from datetime import datetime, timezone
+import models, schemas, crud, async_crud, dependencies, search, http_cache, exporter, importer
+from database import get_db, get_session
 
 router = APIRouter(prefix="/products", tags=["products"])
 
+# The listing, single-product and write endpoints serve both data layers: with
+# ASYNC_DB=1 they await async_crud on the loop, otherwise crud runs in the threadpool
+async def _crud(db, name: str, *args, **kwargs):
+    if isinstance(db, AsyncSession):
+        return await getattr(async_crud, name)(db, *args, **kwargs)
+    return await run_in_threadpool(getattr(crud, name), db, *args, **kwargs)
+
 @router.post("/", response_model=schemas.ProductResponse)
-def create_product(
+async def create_product(
     product: schemas.ProductCreate, 
-    db: Session = Depends(get_db),
+    db = Depends(get_session),
     current_user: models.User = Depends(dependencies.RoleChecker([
         models.UserRole.ADMIN, 
         models.UserRole.MANAGER, 
@@ -17,34 +29,185 @@ def create_product(
         models.UserRole.ACCOUNTANT
     ]))
 ):
-    return crud.create_product(db=db, product=product, user_id=current_user.id)
+    return await _crud(db, "create_product", product=product, user_id=current_user.id)
+
+def _resolve_fields(view: Optional[str], fields: Optional[str]):
+    try:
+        return schemas.resolve_product_fields(view, fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Built once: constructing a TypeAdapter compiles a pydantic-core serializer
+_ANY_ADAPTER = TypeAdapter(Any)
+
+def _projected_response(payload, projection):
+    """Serialize a partial product listing with its slim model, bypassing ProductResponse."""
+    if isinstance(payload, dict):
+        payload = {**payload, "items": [projection.model_validate(p) for p in payload["items"]]}
+    else:
+        payload = [projection.model_validate(p) for p in payload]
+    return Response(content=_ANY_ADAPTER.dump_json(payload), media_type="application/json")
+
+_VIEW_QUERY = Query(None, description=f"Named column set: {', '.join(schemas.PRODUCT_VIEWS)}")
+_FIELDS_QUERY = Query(None, description="Comma-separated ProductResponse fields to return (id is always included)")
+
+async def _listing_etag(db, request: Request):
+    """
+    Weak ETag for a listing: dataset fingerprint plus the query string, since
+    paging/projection parameters change the body. No Last-Modified is sent for
+    listings because max(updated_at) does not move when a row is deleted.
+    """
+    count, max_id, max_updated = await _crud(db, "get_products_fingerprint")
+    return http_cache.weak_etag("products", count, max_id, max_updated, request.url.query)
+
+@router.post("/batch", response_model=schemas.BatchResponse)
+async def batch_products(
+    batch: schemas.BatchRequest,
+    db = Depends(get_session),
+    current_user: models.User = Depends(dependencies.RoleChecker([
+        models.UserRole.ADMIN,
+        models.UserRole.MANAGER,
+        models.UserRole.LOGISTICS,
+        models.UserRole.ACCOUNTANT
+    ]))
+):
+    """
+    Apply up to BATCH_MAX_OPERATIONS create/update/delete operations in one transaction.
+    Deletes follow the same role rule as DELETE /products/{id}.
+    """
+    has_deletes = any(op.op == "delete" for op in batch.operations)
+    if has_deletes and current_user.role not in (models.UserRole.ADMIN, models.UserRole.MANAGER):
+        raise HTTPException(status_code=403, detail="The user doesn't have enough privileges")
+    results = await _crud(db, "apply_batch", batch.operations, user_id=current_user.id)
+    applied = sum(1 for r in results if r["ok"])
+    return {"applied": applied, "failed": len(results) - applied, "results": results}
+
+@router.post("/import", response_model=schemas.ImportResult)
+def import_products(
+    file: UploadFile = File(...),
+    dry_run: bool = False,
+    atomic: bool = False,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(dependencies.RoleChecker([models.UserRole.ADMIN, models.UserRole.MANAGER]))
+):
+    """
+    Bulk-create products from a CSV or Excel manifest whose headers are product field names.
+    Invalid rows are skipped and reported; `atomic=true` rejects the whole file instead.
+    """
+    filename = file.filename or "upload.csv"
+    if not filename.lower().endswith((".csv", ".xlsx", ".xlsm", ".xls")):
+        raise HTTPException(status_code=400, detail="Expected a .csv or .xlsx file")
+    try:
+        return importer.import_products(db, file.file, filename, current_user.id, dry_run=dry_run, atomic=atomic)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Could not read {filename}: {e}")
 
 @router.get("/", response_model=List[schemas.ProductResponse])
-def read_products(
+async def read_products(
+    request: Request,
+    response: Response,
     skip: int = 0, 
     limit: int = 100, 
-    db: Session = Depends(get_db),
+    view: Optional[str] = _VIEW_QUERY,
+    fields: Optional[str] = _FIELDS_QUERY,
+    db = Depends(get_session),
     current_user: models.User = Depends(dependencies.get_current_active_user)
 ):
-    products = crud.get_products(db, skip=skip, limit=limit)
+    columns = _resolve_fields(view, fields)
+    etag = await _listing_etag(db, request)
+    if http_cache.is_not_modified(request, etag):
+        return http_cache.not_modified(etag)
+
+    products = await _crud(db, "get_products", skip=skip, limit=limit, columns=columns)
+    if columns:
+        projected = _projected_response(products, schemas.product_projection(columns))
+        http_cache.set_validators(projected, etag)
+        return projected
+    http_cache.set_validators(response, etag)
     return products
 
+@router.get("/page", response_model=schemas.ProductPage)
+async def read_products_page(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    view: Optional[str] = _VIEW_QUERY,
+    fields: Optional[str] = _FIELDS_QUERY,
+    db = Depends(get_session),
+    current_user: models.User = Depends(dependencies.get_current_active_user)
+):
+    """
+    Cursor-based listing. Pass `next_cursor` from the previous page to continue;
+    omit it to start from the newest product.
+    """
+    columns = _resolve_fields(view, fields)
+    etag = await _listing_etag(db, request)
+    if http_cache.is_not_modified(request, etag):
+        return http_cache.not_modified(etag)
+
+    try:
+        page = await _crud(db, "get_products_page", cursor=cursor, limit=limit, columns=columns)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if columns:
+        projected = _projected_response(page, schemas.product_projection(columns))
+        http_cache.set_validators(projected, etag)
+        return projected
+    http_cache.set_validators(response, etag)
+    return page
+
+@router.get("/export")
+def export_products(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(dependencies.get_current_active_user)
+):
+    """Stream the whole catalog as NDJSON or CSV."""
+    filename = f"products-{datetime.utcnow():%Y%m%d-%H%M%S}.{'csv' if format == 'csv' else 'ndjson'}"
+    return StreamingResponse(
+        exporter.iter_export(db, format),
+        media_type=exporter.EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@router.get("/search", response_model=List[schemas.ProductResponse])
+def search_products(
+    q: str = Query(..., min_length=1, description="Search terms; each term matches as a prefix"),
+    status: Optional[models.CargoStatus] = None,
+    payment_status: Optional[models.PaymentStatus] = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(dependencies.get_current_active_user)
+):
+    return search.search_products(db, q, status=status, payment_status=payment_status, limit=limit)
+
 @router.get("/{product_id}", response_model=schemas.ProductResponse)
-def read_product(
+async def read_product(
     product_id: int, 
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db = Depends(get_session),
     current_user: models.User = Depends(dependencies.get_current_active_user)
 ):
-    db_product = crud.get_product(db, product_id=product_id)
+    exists, updated_at = await _crud(db, "get_product_updated_at", product_id)
+    if not exists:
+        raise HTTPException(status_code=404, detail="Product not found")
+    etag = http_cache.weak_etag("product", product_id, updated_at)
+    if http_cache.is_not_modified(request, etag, updated_at):
+        return http_cache.not_modified(etag, updated_at)
+
+    db_product = await _crud(db, "get_product", product_id=product_id)
     if db_product is None:
         raise HTTPException(status_code=404, detail="Product not found")
+    http_cache.set_validators(response, etag, updated_at)
     return db_product
 
 @router.patch("/{product_id}", response_model=schemas.ProductResponse)
-def update_product(
+async def update_product(
     product_id: int, 
     product_update: schemas.ProductUpdate, 
-    db: Session = Depends(get_db),
+    db = Depends(get_session),
     current_user: models.User = Depends(dependencies.RoleChecker([models.UserRole.ADMIN, models.UserRole.MANAGER, models.UserRole.LOGISTICS, models.UserRole.ACCOUNTANT]))
 ):
     # Additional logic: Logisticians can only update logistics fields, Accountants only financial status
@@ -52,23 +215,68 @@ def update_product(
         # Check if they are trying to update financial fields
         pass
         
-    return crud.update_product(db=db, product_id=product_id, product_update=product_update, user_id=current_user.id)
+    return await _crud(db, "update_product", product_id=product_id, product_update=product_update, user_id=current_user.id)
+
+@router.get("/{product_id}/state", response_model=schemas.ProductState)
+def get_product_state(
+    product_id: int,
+    at: datetime = Query(..., description="Point in time (ISO 8601); naive values are UTC"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(dependencies.get_current_active_user)
+):
+    if at.tzinfo is not None:
+        at = at.astimezone(timezone.utc).replace(tzinfo=None)
+    try:
+        state = crud.get_product_state_at(db, product_id, at)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if state is None:
+        raise HTTPException(status_code=404, detail="Product did not exist at that time")
+    return {"product_id": product_id, "at": at, "state": state}
+
+def _audit_page(db: Session, **kwargs):
+    try:
+        return crud.get_audit_logs_page(db, **kwargs)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/{product_id}/audit", response_model=List[schemas.AuditLogResponse])
 def get_product_audit(
     product_id: int,
+    limit: int = Query(100, ge=1, le=500),
+    user_id: Optional[int] = None,
+    action: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(dependencies.get_current_active_user)
 ):
-    return db.query(models.AuditLog).filter(models.AuditLog.product_id == product_id).order_by(models.AuditLog.timestamp.desc()).all()
+    """Newest `limit` entries; use /audit/page to go further back."""
+    return _audit_page(db, limit=limit, product_id=product_id, user_id=user_id, action=action,
+                       date_from=date_from, date_to=date_to)["items"]
 
-@router.delete("/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_product(
+@router.get("/{product_id}/audit/page", response_model=schemas.AuditLogPage)
+def get_product_audit_page(
     product_id: int,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    user_id: Optional[int] = None,
+    action: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
     db: Session = Depends(get_db),
+    current_user: models.User = Depends(dependencies.get_current_active_user)
+):
+    return _audit_page(db, cursor=cursor, limit=limit, product_id=product_id, user_id=user_id, action=action,
+                       date_from=date_from, date_to=date_to)
+
+@router.delete("/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_product(
+    product_id: int,
+    db = Depends(get_session),
     current_user: models.User = Depends(dependencies.RoleChecker([models.UserRole.ADMIN, models.UserRole.MANAGER]))
 ):
-    success = crud.delete_product(db=db, product_id=product_id, user_id=current_user.id)
+    success = await _crud(db, "delete_product", product_id=product_id, user_id=current_user.id)
     if not success:
         raise HTTPException(status_code=404, detail="Product not found")
     return None
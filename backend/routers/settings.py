@@ -1,13 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
-from typing import List
-import models, schemas, dependencies, crud
+from typing import List, Optional
+from datetime import datetime
+import models, schemas, dependencies, crud, http_cache, settings_service
 from database import get_db
 
 router = APIRouter(prefix="/settings", tags=["settings"])
 
 @router.get("/", response_model=List[schemas.GlobalSettingsResponse])
 def get_settings(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(dependencies.RoleChecker([
         models.UserRole.ADMIN,
@@ -16,7 +19,13 @@ def get_settings(
         models.UserRole.LOGISTICS
     ]))
 ):
-    return db.query(models.GlobalSettings).all()
+    current = settings_service.get_settings(db)
+    etag = http_cache.weak_etag("settings", current.version, current.last_modified)
+    if http_cache.is_not_modified(request, etag, current.last_modified):
+        return http_cache.not_modified(etag, current.last_modified)
+
+    http_cache.set_validators(response, etag, current.last_modified)
+    return list(current.rows)
 
 @router.post("/", response_model=schemas.GlobalSettingsResponse)
 def update_setting(
@@ -32,13 +41,41 @@ def update_setting(
         db_setting = models.GlobalSettings(**setting.dict())
         db.add(db_setting)
     
+    settings_service.bump_version(db)
     db.commit()
+    settings_service.settings_service.invalidate()
     db.refresh(db_setting)
     return db_setting
 
+def _audit_page(db: Session, **kwargs):
+    try:
+        return crud.get_audit_logs_page(db, **kwargs)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.get("/audit", response_model=List[schemas.AuditLogResponse])
 def get_audit_logs(
+    limit: int = Query(100, ge=1, le=500),
+    user_id: Optional[int] = None,
+    action: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(dependencies.RoleChecker([models.UserRole.ADMIN]))
+):
+    return _audit_page(db, limit=limit, user_id=user_id, action=action,
+                       date_from=date_from, date_to=date_to)["items"]
+
+@router.get("/audit/page", response_model=schemas.AuditLogPage)
+def get_audit_logs_page(
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    user_id: Optional[int] = None,
+    action: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(dependencies.RoleChecker([models.UserRole.ADMIN]))
 ):
-    return crud.get_audit_logs(db)
+    return _audit_page(db, cursor=cursor, limit=limit, user_id=user_id, action=action,
+                       date_from=date_from, date_to=date_to)
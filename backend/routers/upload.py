@@ -3,17 +3,42 @@ Cloudinary signed upload proxy.
 The frontend sends the file here; this endpoint signs the request using
 server-side API credentials and forwards to Cloudinary.
 Only the returned secure_url is stored in media_urls — no binary data in DB.
+
+The upload is streamed from Starlette's spooled temporary file to Cloudinary
+in UPLOAD_CHUNK_SIZE pieces, so memory per upload stays at about one chunk
+regardless of file size. All uploads share one pooled httpx.AsyncClient for
+the lifetime of the app (closed on shutdown).
+
+Large files can use the resumable endpoints instead (/upload/resumable):
+the client opens a session, PUTs chunks at byte offsets (each with its
+SHA-256), can ask which ranges arrived after a dropped connection, and
+completes the session, which sends the staged file to Cloudinary's chunked
+upload API. See upload_sessions.py for the staging.
+
+Every upload is hashed (SHA-256, read in chunks) before it is sent. Content
+already in media_assets is answered with the stored URL without contacting
+Cloudinary; GET /upload/stats reports the hit rate.
 """
 import os
 import time
+import asyncio
 import hashlib
 import hmac
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
+import secrets
+from typing import List, Optional
+from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException, Header, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
 import httpx
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
 
 import models
+import schemas
 import dependencies
+import crud
+import upload_sessions
+from database import SessionLocal, get_db
 
 router = APIRouter(prefix="/upload", tags=["Поле данных"])
 
@@ -21,6 +46,62 @@ CLOUDINARY_CLOUD_NAME = os.getenv("CLOUDINARY_CLOUD_NAME", "")
 CLOUDINARY_API_KEY     = os.getenv("CLOUDINARY_API_KEY", "")
 CLOUDINARY_API_SECRET  = os.getenv("CLOUDINARY_API_SECRET", "")
 
+# Cloudinary's own limit on the free plan is 100 MB for videos
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+UPLOAD_TIMEOUT_SECONDS = float(os.getenv("UPLOAD_TIMEOUT_SECONDS", "120"))
+CLOUDINARY_MAX_CONNECTIONS = int(os.getenv("CLOUDINARY_MAX_CONNECTIONS", "10"))
+# Uploads in flight to Cloudinary per process, across all batch requests
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "4"))
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", "20"))
+# Largest single PUT to a resumable session
+RESUMABLE_MAX_CHUNK_BYTES = int(os.getenv("RESUMABLE_MAX_CHUNK_BYTES", str(50 * 1024 * 1024)))
+MEDIA_CACHE_ENABLED = os.getenv("MEDIA_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+# Cloudinary's chunked upload needs every chunk but the last to be at least 5 MB
+CLOUDINARY_CHUNK_SIZE = max(int(os.getenv("CLOUDINARY_CHUNK_SIZE", str(20 * 1024 * 1024))), 5 * 1024 * 1024)
+
+_http_client: Optional[httpx.AsyncClient] = None
+_upload_slots: Optional[asyncio.Semaphore] = None
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """App-wide client: keeps TLS connections to Cloudinary alive between uploads."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(UPLOAD_TIMEOUT_SECONDS, connect=10.0),
+            limits=httpx.Limits(
+                max_connections=CLOUDINARY_MAX_CONNECTIONS,
+                max_keepalive_connections=CLOUDINARY_MAX_CONNECTIONS,
+                keepalive_expiry=60.0,
+            ),
+        )
+    return _http_client
+
+
+def set_http_client(client: Optional[httpx.AsyncClient]):
+    """Swap the shared client (tests point it at a fake Cloudinary)."""
+    global _http_client
+    _http_client = client
+
+
+def _slots() -> asyncio.Semaphore:
+    global _upload_slots
+    if _upload_slots is None:
+        _upload_slots = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+    return _upload_slots
+
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
 
 def _make_signature(params: dict, api_secret: str) -> str:
     """Generate Cloudinary upload signature."""
@@ -30,62 +111,425 @@ def _make_signature(params: dict, api_secret: str) -> str:
     return hashlib.sha256(to_sign.encode("utf-8")).hexdigest()
 
 
-@router.post("/media", summary="Upload image/video to Cloudinary")
-async def upload_media(
-    file: UploadFile = File(...),
-    current_user: models.User = Depends(dependencies.get_current_active_user),
-):
-    """
-    Accepts a single image or video file.
-    Signs the upload with server-side Cloudinary credentials.
-    Returns: { url, public_id, resource_type, format, bytes }
-    """
+def _require_cloudinary():
     if not CLOUDINARY_CLOUD_NAME or not CLOUDINARY_API_KEY or not CLOUDINARY_API_SECRET:
         raise HTTPException(
             status_code=503,
             detail="Cloudinary is not configured on the server. Set CLOUDINARY_CLOUD_NAME, CLOUDINARY_API_KEY, CLOUDINARY_API_SECRET env vars on Render.",
         )
 
+
+def _signed_form(extra: Optional[dict] = None) -> dict:
     timestamp = int(time.time())
     params = {
         "folder": "logistics",
         "timestamp": timestamp,
+        **(extra or {}),
     }
     signature = _make_signature(params, CLOUDINARY_API_SECRET)
+    return {
+        **{k: str(v) for k, v in params.items()},
+        "api_key": CLOUDINARY_API_KEY,
+        "signature": signature,
+    }
 
-    # Read file bytes
-    file_bytes = await file.read()
-    if len(file_bytes) == 0:
-        raise HTTPException(status_code=400, detail="Uploaded file is empty.")
 
-    # Forward to Cloudinary
-    upload_url = f"https://api.cloudinary.com/v1_1/{CLOUDINARY_CLOUD_NAME}/auto/upload"
+def _upload_url() -> str:
+    return f"https://api.cloudinary.com/v1_1/{CLOUDINARY_CLOUD_NAME}/auto/upload"
 
-    form_data = {
-        "api_key": CLOUDINARY_API_KEY,
-        "timestamp": str(timestamp),
-        "signature": signature,
-        "folder": "logistics",
+
+def _multipart_parts(fields: dict, filename: str, content_type: str, boundary: str):
+    """(head, tail) bytes framing the file content in a multipart/form-data body."""
+    head = b"".join(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode("utf-8")
+        for name, value in fields.items()
+    )
+    safe_name = (filename or "upload").replace('"', "%22").replace("\r", "").replace("\n", "")
+    head += (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{safe_name}"\r\n'
+        f"Content-Type: {content_type or 'application/octet-stream'}\r\n\r\n"
+    ).encode("utf-8")
+    tail = f"\r\n--{boundary}--\r\n".encode("utf-8")
+    return head, tail
+
+
+async def _stream_body(head: bytes, first_chunk: bytes, file: UploadFile, tail: bytes, limit: int):
+    yield head
+    sent = len(first_chunk)
+    yield first_chunk
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        sent += len(chunk)
+        if sent > limit:
+            raise UploadTooLarge()
+        yield chunk
+    yield tail
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(status_code=413, detail=f"File exceeds the {MAX_UPLOAD_BYTES // (1024 * 1024)} MB upload limit.")
+
+
+def _result(data: dict) -> dict:
+    return {
+        "url": data["secure_url"],
+        "public_id": data["public_id"],
+        "resource_type": data["resource_type"],
+        "format": data.get("format", ""),
+        "bytes": data.get("bytes", 0),
     }
 
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        response = await client.post(
-            upload_url,
-            data=form_data,
-            files={"file": (file.filename, file_bytes, file.content_type)},
+
+async def forward_to_cloudinary(file: UploadFile) -> dict:
+    """
+    Stream one uploaded file to Cloudinary and return
+    { url, public_id, resource_type, format, bytes }. Raises HTTPException.
+    """
+    _require_cloudinary()
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise _too_large()
+
+    await file.seek(0)
+    first_chunk = await file.read(UPLOAD_CHUNK_SIZE)
+    if not first_chunk:
+        raise HTTPException(status_code=400, detail="Uploaded file is empty.")
+
+    boundary = secrets.token_hex(16)
+    head, tail = _multipart_parts(_signed_form(), file.filename, file.content_type, boundary)
+    headers = {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+    if file.size is not None:
+        headers["Content-Length"] = str(len(head) + file.size + len(tail))
+
+    try:
+        response = await get_http_client().post(
+            _upload_url(),
+            content=_stream_body(head, first_chunk, file, tail, MAX_UPLOAD_BYTES),
+            headers=headers,
         )
+    except UploadTooLarge:
+        raise _too_large()
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Cloudinary upload failed: {e}")
 
     if response.status_code != 200:
         raise HTTPException(
             status_code=502,
             detail=f"Cloudinary upload failed: {response.text}",
         )
+    return _result(response.json())
+
+
+def _with_db(fn, *args):
+    db = SessionLocal()
+    try:
+        return fn(db, *args)
+    finally:
+        db.close()
+
+
+async def _hash_upload(file: UploadFile) -> str:
+    """SHA-256 of an uploaded file, read in UPLOAD_CHUNK_SIZE pieces. Leaves the file rewound."""
+    digest = hashlib.sha256()
+    size = 0
+    await file.seek(0)
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > MAX_UPLOAD_BYTES:
+            raise _too_large()
+        digest.update(chunk)
+    if size == 0:
+        raise HTTPException(status_code=400, detail="Uploaded file is empty.")
+    await file.seek(0)
+    return digest.hexdigest()
+
+
+async def _cached(sha256: str) -> Optional[dict]:
+    try:
+        result = await run_in_threadpool(_with_db, crud.use_cached_media, sha256)
+    except SQLAlchemyError as e:
+        # The cache only saves bandwidth; never fail an upload because of it
+        print(f"UPLOAD: media cache lookup failed: {e}")
+        return None
+    return None if result is None else {**result, "cached": True}
+
+
+async def _remember(sha256: str, result: dict) -> dict:
+    try:
+        result = await run_in_threadpool(_with_db, crud.save_media_asset, sha256, result)
+    except SQLAlchemyError as e:
+        print(f"UPLOAD: media cache write failed: {e}")
+    return {**result, "cached": False}
+
+
+async def upload_or_reuse(file: UploadFile) -> dict:
+    """forward_to_cloudinary, unless the same content was uploaded before."""
+    if not MEDIA_CACHE_ENABLED:
+        return {**await forward_to_cloudinary(file), "cached": False}
+    _require_cloudinary()
+    sha256 = await _hash_upload(file)
+    return await _cached(sha256) or await _remember(sha256, await forward_to_cloudinary(file))
+
+
+@router.post("/media", summary="Upload image/video to Cloudinary")
+async def upload_media(
+    file: UploadFile = File(...),
+    current_user: models.User = Depends(dependencies.get_current_active_user),
+):
+    """
+    Accepts a single image or video file.
+    Signs the upload with server-side Cloudinary credentials.
+    Returns: { url, public_id, resource_type, format, bytes, cached }
+    """
+    return JSONResponse(await upload_or_reuse(file))
+
+
+def _product_exists(db, product_id: int) -> bool:
+    return crud.get_product_updated_at(db, product_id)[0]
+
+
+def _append_to_product(db, product_id: int, urls: List[str], user_id: int):
+    db_product = crud.append_media_urls(db, product_id, urls, user_id)
+    return None if db_product is None else list(db_product.media_urls or [])
+
+
+async def _upload_one(index: int, file: UploadFile) -> dict:
+    result = {"index": index, "filename": file.filename, "ok": False, "error": None}
+    async with _slots():
+        try:
+            result.update(await upload_or_reuse(file), ok=True)
+        except HTTPException as e:
+            result.update(error=e.detail, status_code=e.status_code)
+    return result
+
+
+@router.post("/media/batch", summary="Upload several images/videos to Cloudinary")
+async def upload_media_batch(
+    files: List[UploadFile] = File(...),
+    product_id: Optional[int] = Form(None),
+    current_user: models.User = Depends(dependencies.get_current_active_user),
+):
+    """
+    Forwards every file to Cloudinary concurrently (at most UPLOAD_CONCURRENCY at a time).
+    Returns per-file results in input order; a failed file doesn't fail the others.
+    With `product_id`, the uploaded URLs are appended to that product's media_urls
+    in one audited update.
+    """
+    _require_cloudinary()
+    if len(files) > MAX_BATCH_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_FILES} files per batch.")
+    if product_id is not None and not await run_in_threadpool(_with_db, _product_exists, product_id):
+        raise HTTPException(status_code=404, detail="Product not found")
+
+    results = await asyncio.gather(*(_upload_one(i, f) for i, f in enumerate(files)))
+    urls = [r["url"] for r in results if r["ok"]]
+
+    media_urls = None
+    if product_id is not None and urls:
+        media_urls = await run_in_threadpool(_with_db, _append_to_product, product_id, urls, current_user.id)
+        if media_urls is None:
+            raise HTTPException(status_code=404, detail="Product not found")
 
-    data = response.json()
     return JSONResponse({
-        "url": data["secure_url"],
-        "public_id": data["public_id"],
-        "resource_type": data["resource_type"],
-        "format": data.get("format", ""),
-        "bytes": data.get("bytes", 0),
+        "results": results,
+        "uploaded": len(urls),
+        "failed": len(results) - len(urls),
+        "product_id": product_id,
+        "media_urls": media_urls,
     })
+
+
+def _session_status(meta: dict) -> dict:
+    return {
+        "upload_id": meta["upload_id"],
+        "filename": meta["filename"],
+        "size": meta["size"],
+        "received": upload_sessions.received_bytes(meta),
+        "ranges": meta["ranges"],
+        "missing": upload_sessions.missing_ranges(meta),
+        "complete": upload_sessions.is_complete(meta),
+    }
+
+
+async def _own_session(upload_id: str, current_user: models.User) -> dict:
+    try:
+        meta = await run_in_threadpool(upload_sessions.load, upload_id)
+    except upload_sessions.SessionNotFound:
+        meta = None
+    if meta is None or meta["user_id"] != current_user.id:
+        raise HTTPException(status_code=404, detail="Upload session not found or expired")
+    return meta
+
+
+async def _file_range_body(head: bytes, path: str, start: int, end: int, tail: bytes):
+    yield head
+    with open(path, "rb") as fh:
+        fh.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = await run_in_threadpool(fh.read, min(UPLOAD_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    yield tail
+
+
+async def forward_staged_to_cloudinary(meta: dict) -> dict:
+    """
+    Send a completed session to Cloudinary's chunked upload API: one request
+    per CLOUDINARY_CHUNK_SIZE with the same X-Unique-Upload-Id and a
+    Content-Range each. The last response describes the whole asset.
+    """
+    _require_cloudinary()
+    size = meta["size"]
+    path = upload_sessions.data_path(meta["upload_id"])
+    form = _signed_form()
+    data = None
+    for start in range(0, size, CLOUDINARY_CHUNK_SIZE):
+        end = min(start + CLOUDINARY_CHUNK_SIZE, size)
+        boundary = secrets.token_hex(16)
+        head, tail = _multipart_parts(form, meta["filename"], meta["content_type"], boundary)
+        headers = {
+            "Content-Type": f"multipart/form-data; boundary={boundary}",
+            "Content-Length": str(len(head) + (end - start) + len(tail)),
+            "X-Unique-Upload-Id": meta["upload_id"],
+            "Content-Range": f"bytes {start}-{end - 1}/{size}",
+        }
+        try:
+            response = await get_http_client().post(
+                _upload_url(),
+                content=_file_range_body(head, path, start, end, tail),
+                headers=headers,
+            )
+        except httpx.HTTPError as e:
+            raise HTTPException(status_code=502, detail=f"Cloudinary upload failed: {e}")
+        if response.status_code != 200:
+            raise HTTPException(status_code=502, detail=f"Cloudinary upload failed: {response.text}")
+        data = response.json()
+    return _result(data)
+
+
+@router.post("/resumable", response_model=schemas.ResumableUploadStatus, summary="Start a resumable upload")
+async def create_resumable_upload(
+    upload: schemas.ResumableUploadCreate,
+    current_user: models.User = Depends(dependencies.get_current_active_user),
+):
+    """
+    Opens an upload session for a file of `size` bytes. Send the file with
+    PUT /upload/resumable/{upload_id}?offset=N, then POST .../complete.
+    Sessions idle for UPLOAD_SESSION_TTL_SECONDS are deleted.
+    """
+    _require_cloudinary()
+    if upload.size > MAX_UPLOAD_BYTES:
+        raise _too_large()
+    meta = await run_in_threadpool(
+        upload_sessions.create, upload.filename, upload.content_type, upload.size, current_user.id, upload.sha256
+    )
+    return _session_status(meta)
+
+
+@router.put("/resumable/{upload_id}", response_model=schemas.ResumableUploadStatus, summary="Upload one chunk")
+async def put_resumable_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0, description="Byte offset of this chunk in the file"),
+    x_chunk_sha256: Optional[str] = Header(None, description="SHA-256 of the chunk body; mismatching chunks are rejected"),
+    current_user: models.User = Depends(dependencies.get_current_active_user),
+):
+    """
+    The request body is the raw chunk. Chunks can be sent in any order or
+    resent; the response lists the ranges received so far.
+    """
+    meta = await _own_session(upload_id, current_user)
+    if offset >= meta["size"]:
+        raise HTTPException(status_code=409, detail=f"Offset {offset} is past the end of the file ({meta['size']} bytes).")
+
+    # Stage the chunk next to the session file; it's only copied in once verified
+    part_path = os.path.join(os.path.dirname(upload_sessions.data_path(upload_id)), f"part-{secrets.token_hex(8)}")
+    received = 0
+    try:
+        with open(part_path, "wb") as fh:
+            buffer = bytearray()
+            async for piece in request.stream():
+                received += len(piece)
+                if received > RESUMABLE_MAX_CHUNK_BYTES or offset + received > meta["size"]:
+                    raise HTTPException(status_code=413, detail="Chunk is larger than allowed or runs past the end of the file.")
+                buffer += piece
+                if len(buffer) >= UPLOAD_CHUNK_SIZE:
+                    await run_in_threadpool(fh.write, bytes(buffer))
+                    buffer.clear()
+            if buffer:
+                await run_in_threadpool(fh.write, bytes(buffer))
+        meta = await run_in_threadpool(upload_sessions.add_chunk, upload_id, offset, part_path, x_chunk_sha256)
+    except upload_sessions.ChunkRejected as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except upload_sessions.SessionNotFound:
+        raise HTTPException(status_code=404, detail="Upload session not found or expired")
+    finally:
+        try:
+            os.remove(part_path)
+        except OSError:
+            pass
+    return _session_status(meta)
+
+
+@router.get("/resumable/{upload_id}", response_model=schemas.ResumableUploadStatus, summary="Received ranges of an upload")
+async def get_resumable_upload(
+    upload_id: str,
+    current_user: models.User = Depends(dependencies.get_current_active_user),
+):
+    return _session_status(await _own_session(upload_id, current_user))
+
+
+@router.post("/resumable/{upload_id}/complete", summary="Finish a resumable upload")
+async def complete_resumable_upload(
+    upload_id: str,
+    current_user: models.User = Depends(dependencies.get_current_active_user),
+):
+    """
+    Sends the assembled file to Cloudinary (unless its content is already
+    there) and deletes the staged copy.
+    Returns: { url, public_id, resource_type, format, bytes, cached }
+    If Cloudinary fails the session is kept, so completing can be retried.
+    """
+    meta = await _own_session(upload_id, current_user)
+    if not upload_sessions.is_complete(meta):
+        raise HTTPException(status_code=409, detail={
+            "message": "Upload is incomplete.",
+            "missing": upload_sessions.missing_ranges(meta),
+        })
+    sha256 = await run_in_threadpool(upload_sessions.file_sha256, meta)
+    if meta.get("sha256") and sha256 != meta["sha256"]:
+        await run_in_threadpool(upload_sessions.remove, upload_id)
+        raise HTTPException(status_code=400, detail="File checksum mismatch; the upload has been discarded.")
+
+    result = MEDIA_CACHE_ENABLED and await _cached(sha256)
+    if not result:
+        result = await forward_staged_to_cloudinary(meta)
+        result = await _remember(sha256, result) if MEDIA_CACHE_ENABLED else {**result, "cached": False}
+    await run_in_threadpool(upload_sessions.remove, upload_id)
+    return JSONResponse(result)
+
+
+@router.delete("/resumable/{upload_id}", summary="Cancel a resumable upload")
+async def cancel_resumable_upload(
+    upload_id: str,
+    current_user: models.User = Depends(dependencies.get_current_active_user),
+):
+    await _own_session(upload_id, current_user)
+    await run_in_threadpool(upload_sessions.remove, upload_id)
+    return {"ok": True}
+
+
+@router.get("/stats", response_model=schemas.MediaCacheStats, summary="Media cache hit rate")
+def get_upload_stats(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(dependencies.RoleChecker([models.UserRole.ADMIN, models.UserRole.MANAGER])),
+):
+    """Uploads answered from media_assets vs. sent to Cloudinary, and the bytes that saved."""
+    return crud.get_media_cache_stats(db)
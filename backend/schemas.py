@@ -1,5 +1,7 @@
-from pydantic import BaseModel, Field
-from typing import Optional, List, Any
+from pydantic import BaseModel, Field, ConfigDict, create_model
+from typing import Optional, List, Any, Tuple, Union, Literal, Annotated, Dict
+import os
+from functools import lru_cache
 from datetime import datetime
 from models import UserRole, CargoStatus, PaymentStatus, ShippingMethod
 
@@ -143,6 +145,10 @@ class ProductResponse(ProductBase):
     final_cost: Optional[float] = 0.0
     total_volume: Optional[float] = 0.0
     density: Optional[float] = 0.0
+    package_length: Optional[float] = Field(None, description="Parsed from packaging_size, cm")
+    package_width: Optional[float] = Field(None, description="Parsed from packaging_size, cm")
+    package_height: Optional[float] = Field(None, description="Parsed from packaging_size, cm")
+    package_unit: Optional[str] = Field(None, description="Unit packaging_size was given in (mm, cm, m)")
 
     # Legacy Calculated Fields (Optional because old records may have NULL)
     customs_cost: Optional[float] = 0.0
@@ -156,6 +162,112 @@ class ProductResponse(ProductBase):
     class Config:
         from_attributes = True
 
+class ProductPage(BaseModel):
+    items: List[ProductResponse]
+    next_cursor: Optional[str] = Field(None, description="Opaque cursor for the next page, null on the last page")
+    has_more: bool = False
+
+# Named column sets for table views (`?view=`); `id` is always included
+PRODUCT_VIEWS = {
+    "list": (
+        "product_name", "supplier_name", "order_number", "status", "payment_status",
+        "shipping_method", "quantity", "total_weight", "total_volume", "final_cost", "updated_at",
+    ),
+    "finance": (
+        "product_name", "supplier_name", "order_number", "payment_status", "invoice_number",
+        "price_cny", "cny_rate", "quantity", "usd_rate", "service_percent",
+        "product_cost_kgs", "delivery_cost_usd", "delivery_cost_kgs", "service_fee",
+        "final_cost", "outstanding_balance", "updated_at",
+    ),
+    "logistics": (
+        "product_name", "order_number", "status", "shipping_method", "tracking_number",
+        "warehouse_location", "places_count", "weight_per_box", "total_weight", "packaging_size",
+        "package_length", "package_width", "package_height", "total_volume", "density", "departure_date", "estimated_arrival_date", "actual_arrival_date",
+        "updated_at",
+    ),
+}
+
+def resolve_product_fields(view: Optional[str] = None, fields: Optional[str] = None) -> Optional[Tuple[str, ...]]:
+    """
+    Turn `?view=` / `?fields=` into an ordered tuple of ProductResponse fields.
+    Returns None when the full response was requested. Raises ValueError on unknown names.
+    """
+    if not view and not fields:
+        return None
+    selected = ["id"]
+    if view:
+        if view not in PRODUCT_VIEWS:
+            raise ValueError(f"Unknown view '{view}'. Available: {', '.join(PRODUCT_VIEWS)}")
+        selected.extend(PRODUCT_VIEWS[view])
+    if fields:
+        requested = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [f for f in requested if f not in ProductResponse.model_fields]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        selected.extend(requested)
+    # De-duplicate while keeping order
+    return tuple(dict.fromkeys(selected))
+
+@lru_cache(maxsize=64)
+def product_projection(fields: Tuple[str, ...]):
+    """Slim response model containing only `fields`, derived from ProductResponse."""
+    definitions = {}
+    for name in fields:
+        info = ProductResponse.model_fields[name]
+        definitions[name] = (info.annotation, info)
+    return create_model(
+        "ProductProjection",
+        __config__=ConfigDict(from_attributes=True),
+        **definitions,
+    )
+
+BATCH_MAX_OPERATIONS = int(os.getenv("BATCH_MAX_OPERATIONS", "1000"))
+
+class BatchCreate(BaseModel):
+    op: Literal["create"]
+    data: ProductCreate
+
+class BatchUpdate(BaseModel):
+    op: Literal["update"]
+    id: int
+    data: ProductUpdate
+
+class BatchDelete(BaseModel):
+    op: Literal["delete"]
+    id: int
+
+class BatchRequest(BaseModel):
+    operations: List[Annotated[Union[BatchCreate, BatchUpdate, BatchDelete], Field(discriminator="op")]] = Field(
+        ..., min_length=1, max_length=BATCH_MAX_OPERATIONS
+    )
+
+class BatchItemResult(BaseModel):
+    index: int
+    op: str
+    ok: bool
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+class BatchResponse(BaseModel):
+    applied: int
+    failed: int
+    results: List[BatchItemResult]
+
+class ImportFieldError(BaseModel):
+    field: str
+    message: str
+
+class ImportRowError(BaseModel):
+    row: int = Field(..., description="Spreadsheet row number (header is row 1)")
+    errors: List[ImportFieldError]
+
+class ImportResult(BaseModel):
+    total_rows: int
+    inserted: int
+    errors: List[ImportRowError]
+    ignored_columns: List[str] = Field(default_factory=list, description="Columns that don't match any product field")
+    dry_run: bool = False
+
 class AuditLogResponse(BaseModel):
     id: int
     user_id: int
@@ -165,6 +277,78 @@ class AuditLogResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class AuditLogPage(BaseModel):
+    items: List[AuditLogResponse]
+    next_cursor: Optional[str] = Field(None, description="Opaque cursor for the next page, null on the last page")
+    has_more: bool = False
+
+class ProductState(BaseModel):
+    product_id: int
+    at: datetime
+    state: Dict[str, Any]
+
+class ResumableUploadCreate(BaseModel):
+    filename: str = Field(..., min_length=1, max_length=255)
+    size: int = Field(..., gt=0, description="Total file size in bytes")
+    content_type: Optional[str] = None
+    sha256: Optional[str] = Field(None, pattern=r"^[0-9a-fA-F]{64}$", description="Whole-file checksum, verified on completion")
+
+class ResumableUploadStatus(BaseModel):
+    upload_id: str
+    filename: str
+    size: int
+    received: int
+    ranges: List[Tuple[int, int]] = Field(..., description="Received [start, end) byte ranges")
+    missing: List[Tuple[int, int]]
+    complete: bool
+
+class MediaCacheStats(BaseModel):
+    assets: int = Field(..., description="Distinct files stored on Cloudinary")
+    hits: int = Field(..., description="Uploads answered from the cache")
+    misses: int = Field(..., description="Uploads sent to Cloudinary")
+    hit_rate: float
+    bytes_saved: int = Field(..., description="Upload bytes not sent to Cloudinary thanks to the cache")
+    bytes_uploaded: int
+
+class StatusCount(BaseModel):
+    status: Optional[CargoStatus] = None
+    count: int
+
+class PaymentStatusCount(BaseModel):
+    payment_status: Optional[PaymentStatus] = None
+    count: int
+
+class ShippingMethodTotals(BaseModel):
+    shipping_method: Optional[ShippingMethod] = None
+    count: int
+    weight_kg: float
+    total_weight: float
+    total_volume: float
+
+class MonthlyTotals(BaseModel):
+    month: str = Field(..., description="Calendar month of created_at, YYYY-MM")
+    count: int
+    final_cost: float
+    expenses: float = Field(..., description="Product cost + delivery cost (KGS)")
+    outstanding_balance: float
+
+class AnalyticsSummary(BaseModel):
+    count: int
+    final_cost: float
+    outstanding_balance: float
+    by_status: List[StatusCount]
+    by_payment_status: List[PaymentStatusCount]
+    by_shipping_method: List[ShippingMethodTotals]
+    monthly: List[MonthlyTotals]
+
+class MonthlyTrend(BaseModel):
+    month: str
+    count: int
+    final_cost: float
+    total_weight: float
+    total_volume: float
+    outstanding_balance: float
+
 class GlobalSettingsBase(BaseModel):
     key: str
     value: Any
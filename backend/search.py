@@ -0,0 +1,145 @@
+"""
+Full-text product search.
+
+SQLite: an FTS5 external-content table (products_fts) mirrors the searchable
+columns of `products` and is kept in sync by triggers.
+Postgres: a GIN index over a weighted tsvector expression; Postgres maintains
+it on every write, so no triggers are needed.
+Anything else (or SQLite built without FTS5) falls back to LIKE matching.
+"""
+import re
+from sqlalchemy import text, func, or_, literal_column, Integer, Float
+from sqlalchemy.orm import Session
+import models
+
+SEARCH_COLUMNS = ("product_name", "supplier_name", "order_number")
+
+# Which index load_search_backend() found at startup: "fts5", "postgres" or None
+_backend = None
+
+_SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        product_name, supplier_name, order_number,
+        content='products', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, product_name, supplier_name, order_number)
+        VALUES (new.id, new.product_name, new.supplier_name, new.order_number);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, product_name, supplier_name, order_number)
+        VALUES ('delete', old.id, old.product_name, old.supplier_name, old.order_number);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF product_name, supplier_name, order_number ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, product_name, supplier_name, order_number)
+        VALUES ('delete', old.id, old.product_name, old.supplier_name, old.order_number);
+        INSERT INTO products_fts(rowid, product_name, supplier_name, order_number)
+        VALUES (new.id, new.product_name, new.supplier_name, new.order_number);
+    END
+    """,
+]
+
+# Product name outranks supplier, supplier outranks order number
+_PG_VECTOR = (
+    "(setweight(to_tsvector('simple', coalesce(product_name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(supplier_name, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(order_number, '')), 'C'))"
+)
+
+_PG_DDL = [
+    f"CREATE INDEX IF NOT EXISTS ix_products_search ON products USING GIN ({_PG_VECTOR})",
+]
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def create_search_index(conn):
+    """Create the search index for the connection's dialect (idempotent). Run by migration step 8."""
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type='table' AND name='products_fts'")
+        ).first()
+        for ddl in _SQLITE_DDL:
+            conn.execute(text(ddl))
+        if not exists:
+            # Index rows that were there before the FTS table existed
+            conn.execute(text("INSERT INTO products_fts(products_fts) VALUES ('rebuild')"))
+    elif dialect == "postgresql":
+        for ddl in _PG_DDL:
+            conn.execute(text(ddl))
+
+
+def load_search_backend(engine):
+    """Pick the query path from the index the migration created. One catalog lookup, no DDL."""
+    global _backend
+    dialect = engine.dialect.name
+    _backend = None
+    try:
+        with engine.connect() as conn:
+            if dialect == "sqlite":
+                if conn.execute(text("SELECT 1 FROM sqlite_master WHERE type='table' AND name='products_fts'")).first():
+                    _backend = "fts5"
+            elif dialect == "postgresql":
+                if conn.execute(text("SELECT 1 FROM pg_indexes WHERE indexname = 'ix_products_search'")).first():
+                    _backend = "postgres"
+    except Exception as e:
+        print(f"Search index lookup failed: {e}")
+    if _backend is None:
+        print("Search index unavailable, falling back to LIKE search")
+    return _backend
+
+
+def tokenize(q: str):
+    return _TOKEN_RE.findall(q or "")
+
+
+def search_products(db: Session, q: str, status=None, payment_status=None, limit: int = 50):
+    """
+    Prefix search over product name, supplier and order number, best matches first.
+    Every token must match (AND); each token matches as a prefix.
+    """
+    tokens = tokenize(q)
+    if not tokens:
+        return []
+
+    query = db.query(models.Product)
+    if _backend == "fts5":
+        match = " ".join(f'"{t}"*' for t in tokens)
+        hits = (
+            text(
+                "SELECT rowid AS id, bm25(products_fts, 4.0, 2.0, 1.0) AS rank "
+                "FROM products_fts WHERE products_fts MATCH :match"
+            )
+            .bindparams(match=match)
+            .columns(id=Integer, rank=Float)
+            .subquery()
+        )
+        query = query.join(hits, models.Product.id == hits.c.id)
+        order = hits.c.rank.asc()
+    elif _backend == "postgres":
+        vector = literal_column(_PG_VECTOR)
+        tsquery = func.to_tsquery("simple", " & ".join(f"{t}:*" for t in tokens))
+        query = query.filter(vector.op("@@")(tsquery))
+        order = func.ts_rank(vector, tsquery).desc()
+    else:
+        for t in tokens:
+            # \w+ tokens can contain "_", a LIKE wildcard
+            pattern = "%" + t.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            query = query.filter(or_(*(getattr(models.Product, c).ilike(pattern, escape="\\") for c in SEARCH_COLUMNS)))
+        order = models.Product.id.desc()
+
+    if status:
+        query = query.filter(models.Product.status == status)
+    if payment_status:
+        query = query.filter(models.Product.payment_status == payment_status)
+
+    return query.order_by(order, models.Product.id.desc()).limit(limit).all()
@@ -0,0 +1,42 @@
+"""
+JSON encoding for JSON columns (audit details, media_urls) and NDJSON export.
+
+Uses orjson when it is installed, which serializes datetimes, enums and nested
+dicts natively in C; `default` covers the remaining types. Falls back to the
+standard library with the same hook.
+"""
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def default(obj):
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    def dumps(obj) -> str:
+        return orjson.dumps(obj, default=default).decode("utf-8")
+
+    def loads(value):
+        # SQLite hands back bare numbers from JSON columns (numeric affinity)
+        if isinstance(value, (int, float)):
+            return value
+        return orjson.loads(value)
+else:
+    def dumps(obj) -> str:
+        return json.dumps(obj, default=default, ensure_ascii=False)
+
+    loads = json.loads
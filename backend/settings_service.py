@@ -0,0 +1,119 @@
+"""
+In-process cache of the `settings` table.
+
+Each worker keeps a snapshot of all settings plus the version number it was
+loaded at. Writers bump `settings_version` in the same transaction as the
+change and invalidate their own snapshot immediately; other workers compare
+versions (one primary-key lookup) at most every SETTINGS_VERSION_CHECK_SECONDS
+and reload only when it moved. Reads in between cost no queries.
+"""
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+import models
+from database import SessionLocal
+
+VERSION_CHECK_SECONDS = float(os.getenv("SETTINGS_VERSION_CHECK_SECONDS", "2"))
+VERSION_ROW_ID = 1
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Typed view of the settings table; defaults mirror the seeded values."""
+    customs_rate_kg: float = 2.5
+    customs_percent: float = 15.0
+    delivery_rate_kg: float = 1.5
+    delivery_rate_m3: float = 350.0
+    company_margin_percent: float = 10.0
+    cny_to_kgs: float = 12.5
+    usd_to_kgs: float = 89.0
+    version: int = 0
+    last_modified: Optional[datetime] = None
+    # key -> value for every row, including keys without a typed attribute
+    values: dict = field(default_factory=dict)
+    # Full rows (id, key, value, description) for GET /settings/
+    rows: tuple = ()
+
+    @classmethod
+    def from_rows(cls, rows, version: int):
+        values = {r.key: r.value for r in rows}
+        typed = {}
+        for name in cls.__dataclass_fields__:
+            if name in values and name not in ("version", "last_modified", "values", "rows"):
+                try:
+                    typed[name] = float(values[name])
+                except (TypeError, ValueError):
+                    print(f"Setting {name} has non-numeric value {values[name]!r}, using default")
+        timestamps = [r.updated_at for r in rows if r.updated_at]
+        return cls(
+            **typed,
+            version=version,
+            last_modified=max(timestamps) if timestamps else None,
+            values=values,
+            rows=tuple(
+                {"id": r.id, "key": r.key, "value": r.value, "description": r.description} for r in rows
+            ),
+        )
+
+
+def read_version(db: Session) -> int:
+    row = db.get(models.SettingsVersion, VERSION_ROW_ID)
+    return row.version if row else 0
+
+
+def bump_version(db: Session):
+    """Increment the shared version inside the caller's transaction (caller commits)."""
+    updated = db.execute(
+        update(models.SettingsVersion)
+        .where(models.SettingsVersion.id == VERSION_ROW_ID)
+        .values(version=models.SettingsVersion.version + 1)
+    ).rowcount
+    if not updated:
+        db.add(models.SettingsVersion(id=VERSION_ROW_ID, version=1))
+
+
+class SettingsService:
+    def __init__(self, check_interval: float = VERSION_CHECK_SECONDS):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._snapshot: Optional[Settings] = None
+        self._checked_at = 0.0
+
+    def get(self, db: Optional[Session] = None) -> Settings:
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return snapshot
+
+        with self._lock:
+            # Another thread may have refreshed while we waited
+            if self._snapshot is not None and time.monotonic() - self._checked_at < self.check_interval:
+                return self._snapshot
+            own_session = db is None
+            session = SessionLocal() if own_session else db
+            try:
+                version = read_version(session)
+                if self._snapshot is None or self._snapshot.version != version:
+                    rows = session.query(models.GlobalSettings).order_by(models.GlobalSettings.id).all()
+                    self._snapshot = Settings.from_rows(rows, version)
+                self._checked_at = time.monotonic()
+                return self._snapshot
+            finally:
+                if own_session:
+                    session.close()
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+            self._checked_at = 0.0
+
+
+settings_service = SettingsService()
+
+
+def get_settings(db: Optional[Session] = None) -> Settings:
+    return settings_service.get(db)
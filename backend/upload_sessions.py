@@ -0,0 +1,199 @@
+"""
+Resumable upload sessions, staged on local disk.
+
+Each session is a directory under UPLOAD_STAGING_DIR holding the file being
+assembled ("data", written at the offsets the client sends) and "meta.json"
+with the declared size, the byte ranges received so far and an optional
+SHA-256 of the whole file. Chunks may arrive in any order and may be resent;
+a chunk only counts as received once its checksum matches.
+
+Sessions untouched for UPLOAD_SESSION_TTL_SECONDS are removed by gc(), which
+runs at startup and at most every UPLOAD_GC_INTERVAL_SECONDS when sessions
+are created.
+"""
+import hashlib
+import json
+import os
+import secrets
+import shutil
+import tempfile
+import threading
+import time
+from typing import List, Optional
+
+UPLOAD_STAGING_DIR = os.getenv("UPLOAD_STAGING_DIR", os.path.join(tempfile.gettempdir(), "logistics-uploads"))
+UPLOAD_SESSION_TTL_SECONDS = int(os.getenv("UPLOAD_SESSION_TTL_SECONDS", str(24 * 3600)))
+UPLOAD_GC_INTERVAL_SECONDS = int(os.getenv("UPLOAD_GC_INTERVAL_SECONDS", "600"))
+
+_locks = {}
+_locks_guard = threading.Lock()
+_last_gc = 0.0
+
+
+class SessionNotFound(Exception):
+    pass
+
+
+class ChunkRejected(Exception):
+    pass
+
+
+def _lock(upload_id: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(upload_id, threading.Lock())
+
+
+def _dir(upload_id: str) -> str:
+    # Ids are generated here; anything else can't name a session
+    if not upload_id or not all(c in "0123456789abcdef" for c in upload_id):
+        raise SessionNotFound(upload_id)
+    return os.path.join(UPLOAD_STAGING_DIR, upload_id)
+
+
+def data_path(upload_id: str) -> str:
+    return os.path.join(_dir(upload_id), "data")
+
+
+def _save(meta: dict):
+    path = os.path.join(_dir(meta["upload_id"]), "meta.json")
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(meta, fh)
+    os.replace(tmp, path)
+
+
+def load(upload_id: str) -> dict:
+    try:
+        with open(os.path.join(_dir(upload_id), "meta.json"), encoding="utf-8") as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        raise SessionNotFound(upload_id)
+
+
+def merge_ranges(ranges: List[List[int]]) -> List[List[int]]:
+    """Sorted, non-overlapping [start, end) ranges; touching ranges are joined."""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def missing_ranges(meta: dict) -> List[List[int]]:
+    missing, position = [], 0
+    for start, end in meta["ranges"]:
+        if start > position:
+            missing.append([position, start])
+        position = end
+    if position < meta["size"]:
+        missing.append([position, meta["size"]])
+    return missing
+
+
+def received_bytes(meta: dict) -> int:
+    return sum(end - start for start, end in meta["ranges"])
+
+
+def is_complete(meta: dict) -> bool:
+    return meta["ranges"] == [[0, meta["size"]]]
+
+
+def create(filename: str, content_type: str, size: int, user_id: Optional[int], sha256: Optional[str] = None) -> dict:
+    maybe_gc()
+    upload_id = secrets.token_hex(16)
+    os.makedirs(_dir(upload_id))
+    # Sparse file of the final size; chunks are written into place
+    with open(data_path(upload_id), "wb") as fh:
+        fh.truncate(size)
+    now = time.time()
+    meta = {
+        "upload_id": upload_id,
+        "filename": filename,
+        "content_type": content_type,
+        "size": size,
+        "sha256": sha256.lower() if sha256 else None,
+        "user_id": user_id,
+        "ranges": [],
+        "created_at": now,
+        "updated_at": now,
+    }
+    _save(meta)
+    return meta
+
+
+def add_chunk(upload_id: str, offset: int, part_path: str, checksum: Optional[str]) -> dict:
+    """
+    Copy a staged chunk into the session file at `offset` and record its range.
+    The chunk is verified before anything is written, so a corrupt resend can't
+    damage bytes that were already received.
+    """
+    with _lock(upload_id):
+        meta = load(upload_id)
+        length = os.path.getsize(part_path)
+        if length == 0:
+            raise ChunkRejected("Chunk is empty.")
+        if offset < 0 or offset + length > meta["size"]:
+            raise ChunkRejected(f"Chunk {offset}-{offset + length} is outside the declared size {meta['size']}.")
+        if checksum:
+            digest = hashlib.sha256()
+            with open(part_path, "rb") as fh:
+                for block in iter(lambda: fh.read(1024 * 1024), b""):
+                    digest.update(block)
+            if digest.hexdigest() != checksum.lower():
+                raise ChunkRejected("Chunk checksum mismatch.")
+
+        with open(part_path, "rb") as src, open(data_path(upload_id), "r+b") as dst:
+            dst.seek(offset)
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        meta["ranges"] = merge_ranges(meta["ranges"] + [[offset, offset + length]])
+        meta["updated_at"] = time.time()
+        _save(meta)
+        return meta
+
+
+def file_sha256(meta: dict) -> str:
+    digest = hashlib.sha256()
+    with open(data_path(meta["upload_id"]), "rb") as fh:
+        for block in iter(lambda: fh.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def remove(upload_id: str):
+    shutil.rmtree(_dir(upload_id), ignore_errors=True)
+    with _locks_guard:
+        _locks.pop(upload_id, None)
+
+
+def gc(now: Optional[float] = None) -> int:
+    """Remove sessions idle for longer than the TTL. Returns how many were removed."""
+    global _last_gc
+    now = now or time.time()
+    _last_gc = now
+    if not os.path.isdir(UPLOAD_STAGING_DIR):
+        return 0
+    removed = 0
+    for upload_id in os.listdir(UPLOAD_STAGING_DIR):
+        try:
+            updated_at = load(upload_id)["updated_at"]
+        except (SessionNotFound, ValueError, KeyError):
+            # Half-created or unreadable session: fall back to the directory's mtime
+            try:
+                updated_at = os.path.getmtime(os.path.join(UPLOAD_STAGING_DIR, upload_id))
+            except OSError:
+                continue
+        if now - updated_at > UPLOAD_SESSION_TTL_SECONDS:
+            shutil.rmtree(os.path.join(UPLOAD_STAGING_DIR, upload_id), ignore_errors=True)
+            with _locks_guard:
+                _locks.pop(upload_id, None)
+            removed += 1
+    return removed
+
+
+def maybe_gc():
+    if time.time() - _last_gc > UPLOAD_GC_INTERVAL_SECONDS:
+        removed = gc()
+        if removed:
+            print(f"UPLOAD: removed {removed} expired upload sessions")
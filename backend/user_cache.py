@@ -0,0 +1,107 @@
+"""
+Bounded TTL caches for authentication.
+
+- decoded tokens: raw JWT -> claims, so HS256 verification isn't repeated for
+  tokens seen recently (never kept past the token's own `exp`)
+- users: username -> detached copy of the User row, so authenticated requests
+  don't query `users` every time
+
+User entries are dropped whenever a User row is updated or deleted through the
+ORM in this process; other workers pick up changes within USER_CACHE_TTL_SECONDS.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event, inspect
+import models
+
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "4096"))
+
+
+class TTLCache:
+    """Thread-safe LRU with a per-entry expiry."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float = None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+token_cache = TTLCache(TOKEN_CACHE_SIZE, USER_CACHE_TTL_SECONDS)
+user_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS)
+
+
+def cache_token(token: str, payload: dict):
+    exp = payload.get("exp")
+    # Never serve a token from cache after it expires
+    ttl = exp - time.time() if exp else None
+    token_cache.set(token, payload, ttl)
+
+
+def detached_user(user: models.User) -> models.User:
+    """Session-free copy safe to share between requests (no password hash)."""
+    return models.User(
+        id=user.id,
+        username=user.username,
+        email=user.email,
+        role=user.role,
+        created_at=user.created_at,
+    )
+
+
+def cache_user(user: models.User) -> models.User:
+    copy = detached_user(user)
+    user_cache.set(user.username, copy)
+    return copy
+
+
+def invalidate_user(username: str):
+    user_cache.pop(username)
+
+
+def clear():
+    token_cache.clear()
+    user_cache.clear()
+
+
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _invalidate_on_change(mapper, connection, target):
+    invalidate_user(target.username)
+    # A rename leaves the old username cached too
+    for old in inspect(target).attrs.username.history.deleted or ():
+        invalidate_user(old)
@@ -0,0 +1,63 @@
+"""
+Login throughput benchmark.
+
+Fires CONCURRENCY simultaneous logins at the app in-process while a probe keeps
+requesting GET / and records how long the event loop makes it wait.
+Before bcrypt moved off the event loop, probe latency grew with every queued login.
+
+Usage: python bench_login.py [logins] [concurrency]
+Env:   BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS (see backend/auth.py)
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+# Isolated throwaway database
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench_login.db")
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+import httpx
+import main
+
+
+async def run(total_logins: int, concurrency: int):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        semaphore = asyncio.Semaphore(concurrency)
+        done = asyncio.Event()
+        probe_latencies = []
+
+        async def login():
+            async with semaphore:
+                r = await client.post("/auth/token", data={"username": "admin", "password": "admin123"})
+                assert r.status_code == 200, r.text
+
+        async def probe():
+            while not done.is_set():
+                started = time.perf_counter()
+                await client.get("/")
+                probe_latencies.append(time.perf_counter() - started)
+                await asyncio.sleep(0.01)
+
+        probe_task = asyncio.create_task(probe())
+        started = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(total_logins)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await probe_task
+
+    print(f"bcrypt rounds={main.auth.BCRYPT_ROUNDS} workers={main.auth.PASSWORD_HASH_WORKERS}")
+    print(f"{total_logins} logins, concurrency {concurrency}: {elapsed:.2f}s ({total_logins / elapsed:.1f} logins/s)")
+    if probe_latencies:
+        print(f"GET / while logging in: median {statistics.median(probe_latencies) * 1000:.1f} ms, "
+              f"max {max(probe_latencies) * 1000:.1f} ms over {len(probe_latencies)} probes")
+
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    main.startup_event()
+    asyncio.run(run(total, concurrency))
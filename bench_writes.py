@@ -0,0 +1,141 @@
+"""
+Product write-path benchmark.
+
+Runs N creates, updates and deletes through crud and reports per-operation
+latency, SQL statements and commits. For comparison, the same operations also
+run through the previous write path (commit the product, refresh it, then commit
+the audit row separately).
+
+Usage: python bench_writes.py [operations]
+Env:   BENCH_DATABASE_URL  database to run against (default: throwaway SQLite file).
+                           Point it at a scratch Postgres database to benchmark Postgres;
+                           products and audit rows are written to it.
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ["DATABASE_URL"] = os.getenv("BENCH_DATABASE_URL") or \
+    "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench_writes.db")
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from sqlalchemy import event
+import models, schemas, crud, rollups, audit
+from database import Base, engine, SessionLocal
+
+stats = {"statements": 0, "commits": 0}
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    stats["statements"] += 1
+
+
+@event.listens_for(engine, "commit")
+def _count_commit(conn):
+    stats["commits"] += 1
+
+
+def legacy_create(db, product, user_id):
+    db_product = models.Product(**product.model_dump())
+    crud.recalculate_product_costs(db_product)
+    db.add(db_product)
+    db.commit()
+    db.refresh(db_product)
+    rollups.apply_change(db, after=rollups.snapshot(db_product))
+    db.add(models.AuditLog(user_id=user_id, product_id=db_product.id, action="Created Product",
+                           details={"after": crud.to_serializable(product.model_dump())}))
+    db.commit()
+    return db_product
+
+
+def legacy_update(db, product_id, product_update, user_id):
+    db_product = crud.get_product(db, product_id)
+    old_data = {c.name: crud.to_serializable(getattr(db_product, c.name)) for c in db_product.__table__.columns}
+    old_rollup = rollups.snapshot(db_product)
+    for key, value in product_update.model_dump(exclude_unset=True).items():
+        setattr(db_product, key, value)
+    crud.recalculate_product_costs(db_product)
+    db.commit()
+    db.refresh(db_product)
+    rollups.apply_change(db, before=old_rollup, after=rollups.snapshot(db_product))
+    new_data = {c.name: crud.to_serializable(getattr(db_product, c.name)) for c in db_product.__table__.columns}
+    db.add(models.AuditLog(user_id=user_id, product_id=db_product.id, action="Updated Product",
+                           details={"before": old_data, "after": new_data}))
+    db.commit()
+    return db_product
+
+
+def legacy_delete(db, product_id, user_id):
+    db_product = crud.get_product(db, product_id)
+    old_data = {c.name: crud.to_serializable(getattr(db_product, c.name)) for c in db_product.__table__.columns}
+    old_rollup = rollups.snapshot(db_product)
+    db.delete(db_product)
+    db.commit()
+    rollups.apply_change(db, before=old_rollup)
+    db.add(models.AuditLog(user_id=user_id, product_id=None, action="Deleted Product",
+                           details={"before": old_data, "id": product_id}))
+    db.commit()
+    return True
+
+
+PATHS = {
+    "legacy": (legacy_create, legacy_update, legacy_delete),
+    "current": (crud.create_product, crud.update_product, crud.delete_product),
+}
+
+
+def sample_product(i):
+    return schemas.ProductCreate(
+        product_name=f"Bench {i}", supplier_name=f"Supplier {i % 7}", order_number=f"BENCH-{i}",
+        price_cny=10 + i % 50, cny_rate=12.5, quantity=1 + i % 20, places_count=1 + i % 5,
+        weight_per_box=3.5, packaging_size="50x40x30", delivery_rate_usd_per_kg=2, usd_rate=89,
+    )
+
+
+def measure(label, fn, args_list):
+    db = SessionLocal()
+    results = []
+    stats.update(statements=0, commits=0)
+    timings = []
+    try:
+        for args in args_list:
+            started = time.perf_counter()
+            results.append(fn(db, *args))
+            timings.append(time.perf_counter() - started)
+            # Each request gets a fresh session in the app
+            db.close()
+            db = SessionLocal()
+    finally:
+        db.close()
+    n = len(args_list)
+    print(f"  {label:<8} median {statistics.median(timings) * 1000:7.2f} ms  "
+          f"p95 {sorted(timings)[int(n * 0.95) - 1] * 1000:7.2f} ms  "
+          f"{stats['statements'] / n:5.1f} statements/op  {stats['commits'] / n:.1f} commits/op")
+    return results
+
+
+def run(n):
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    user = db.query(models.User).filter(models.User.username == "bench").first()
+    if user is None:
+        user = models.User(username="bench", email="bench@example.com", hashed_password="-")
+        db.add(user)
+        db.commit()
+    user_id = user.id
+    db.close()
+
+    print(f"{engine.dialect.name}, {n} operations per step, audit mode {audit.sink.mode}")
+    for path, (create, update, delete) in PATHS.items():
+        print(f"{path}:")
+        products = measure("create", create, [(sample_product(i), user_id) for i in range(n)])
+        ids = [p.id for p in products]
+        measure("update", update, [(pid, schemas.ProductUpdate(quantity=42, status="In Transit"), user_id) for pid in ids])
+        measure("delete", delete, [(pid, user_id) for pid in ids])
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
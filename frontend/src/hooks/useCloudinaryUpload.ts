@@ -12,6 +12,92 @@ export interface UploadResult {
     resource_type: 'image' | 'video' | 'raw';
     format: string;
     bytes: number;
+    cached?: boolean;  // served from the backend media cache, Cloudinary not contacted
+}
+
+interface BatchItem extends Partial<UploadResult> {
+    index: number;
+    filename: string;
+    ok: boolean;
+    error?: string | null;
+}
+
+interface BatchResponse {
+    results: BatchItem[];
+    uploaded: number;
+    failed: number;
+}
+
+interface ResumableStatus {
+    upload_id: string;
+    size: number;
+    received: number;
+    missing: [number, number][];
+    complete: boolean;
+}
+
+// Files above this go through the resumable endpoints, in chunks that survive a dropped connection
+const RESUMABLE_THRESHOLD = 20 * 1024 * 1024;
+const RESUMABLE_CHUNK_SIZE = 5 * 1024 * 1024;
+const CHUNK_ATTEMPTS = 5;
+
+const sleep = (ms: number) => new Promise(resolve => setTimeout(resolve, ms));
+
+async function sha256Hex(blob: Blob): Promise<string> {
+    const digest = await crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+    return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+}
+
+// Remembers the session per file so a retry after a reload picks up where it stopped
+const sessionKey = (file: File) => `upload:${file.name}:${file.size}:${file.lastModified}`;
+
+async function openSession(file: File): Promise<ResumableStatus> {
+    const saved = localStorage.getItem(sessionKey(file));
+    if (saved) {
+        try {
+            const { data } = await api.get<ResumableStatus>(`/upload/resumable/${saved}`);
+            return data;
+        } catch {
+            localStorage.removeItem(sessionKey(file));
+        }
+    }
+    const { data } = await api.post<ResumableStatus>('/upload/resumable', {
+        filename: file.name,
+        size: file.size,
+        content_type: file.type || null,
+    });
+    localStorage.setItem(sessionKey(file), data.upload_id);
+    return data;
+}
+
+async function putChunk(uploadId: string, offset: number, chunk: Blob): Promise<void> {
+    const checksum = await sha256Hex(chunk);
+    for (let attempt = 1; ; attempt++) {
+        try {
+            await api.put(`/upload/resumable/${uploadId}`, chunk, {
+                params: { offset },
+                headers: { 'Content-Type': 'application/octet-stream', 'X-Chunk-Sha256': checksum },
+            });
+            return;
+        } catch (err: any) {
+            const status = err?.response?.status;
+            // 4xx other than a timeout won't get better by retrying
+            if (attempt >= CHUNK_ATTEMPTS || (status && status < 500 && status !== 408)) throw err;
+            await sleep(1000 * 2 ** (attempt - 1));
+        }
+    }
+}
+
+async function uploadResumable(file: File): Promise<UploadResult> {
+    const session = await openSession(file);
+    for (const [start, end] of session.missing) {
+        for (let offset = start; offset < end; offset += RESUMABLE_CHUNK_SIZE) {
+            await putChunk(session.upload_id, offset, file.slice(offset, Math.min(offset + RESUMABLE_CHUNK_SIZE, end)));
+        }
+    }
+    const { data } = await api.post<UploadResult>(`/upload/resumable/${session.upload_id}/complete`);
+    localStorage.removeItem(sessionKey(file));
+    return data;
 }
 
 export function useCloudinaryUpload() {
@@ -21,24 +107,25 @@ export function useCloudinaryUpload() {
     // Always "configured" — the backend handles the keys
     const isConfigured = true;
 
-    const uploadFile = useCallback(async (file: File): Promise<UploadResult | null> => {
+    // Keep in step with MAX_BATCH_FILES on the backend
+    const batchSize = 20;
+
+    const uploadBatch = useCallback(async (batch: File[]): Promise<BatchItem[]> => {
         try {
-            setUploadError(null);
             const formData = new FormData();
-            formData.append('file', file);
+            batch.forEach(file => formData.append('files', file));
 
-            const response = await api.post<UploadResult>('/upload/media', formData, {
+            const response = await api.post<BatchResponse>('/upload/media/batch', formData, {
                 headers: { 'Content-Type': 'multipart/form-data' },
             });
 
-            return response.data;
+            return response.data.results;
         } catch (err: any) {
             const msg =
                 err?.response?.data?.detail ||
                 err?.message ||
                 'Upload failed. Check backend Cloudinary config.';
-            setUploadError(msg);
-            return null;
+            return batch.map((file, index) => ({ index, filename: file.name, ok: false, error: msg }));
         }
     }, []);
 
@@ -47,18 +134,39 @@ export function useCloudinaryUpload() {
         onProgress?: (done: number, total: number) => void,
     ): Promise<string[]> => {
         setUploading(true);
+        setUploadError(null);
         const arr = Array.from(files);
-        const urls: string[] = [];
+        const urls: (string | null)[] = arr.map(() => null);
+        const small = arr.map((file, i) => ({ file, i })).filter(({ file }) => file.size <= RESUMABLE_THRESHOLD);
+        const large = arr.map((file, i) => ({ file, i })).filter(({ file }) => file.size > RESUMABLE_THRESHOLD);
+        let done = 0;
+        onProgress?.(0, arr.length);
+
+        // The backend uploads each batch to Cloudinary in parallel and returns results in input order
+        for (let b = 0; b < small.length; b += batchSize) {
+            const slice = small.slice(b, b + batchSize);
+            const results = await uploadBatch(slice.map(({ file }) => file));
+            results.forEach((result, k) => {
+                if (result.ok && result.url) urls[slice[k].i] = result.url;
+                else setUploadError(result.error || 'Upload failed.');
+            });
+            done += slice.length;
+            onProgress?.(done, arr.length);
+        }
 
-        for (let i = 0; i < arr.length; i++) {
-            const result = await uploadFile(arr[i]);
-            if (result) urls.push(result.url);
-            onProgress?.(i + 1, arr.length);
+        for (const { file, i } of large) {
+            try {
+                urls[i] = (await uploadResumable(file)).url;
+            } catch (err: any) {
+                setUploadError(err?.response?.data?.detail?.message || err?.response?.data?.detail || err?.message || 'Upload failed.');
+            }
+            done += 1;
+            onProgress?.(done, arr.length);
         }
 
         setUploading(false);
-        return urls;
-    }, [uploadFile]);
+        return urls.filter((url): url is string => url !== null);
+    }, [uploadBatch]);
 
     return { uploadFiles, uploading, uploadError, isConfigured };
 }
@@ -25,20 +25,29 @@ import {
 } from 'recharts';
 import api from '../services/api';
 import { useLanguage } from '../context/LanguageContext';
-import { Product } from '../types';
 
 const COLORS = ['#00f2ff', '#00ff9d', '#ff9f0a', '#ff2d55', '#00d2ff'];
 
+interface AnalyticsSummary {
+    count: number;
+    final_cost: number;
+    outstanding_balance: number;
+    by_status: { status: string | null; count: number }[];
+    by_payment_status: { payment_status: string | null; count: number }[];
+    by_shipping_method: { shipping_method: string | null; count: number; weight_kg: number; total_weight: number; total_volume: number }[];
+    monthly: { month: string; count: number; final_cost: number; expenses: number; outstanding_balance: number }[];
+}
+
 const Analytics: React.FC = () => {
-    const [products, setProducts] = useState<Product[]>([]);
+    const [summary, setSummary] = useState<AnalyticsSummary | null>(null);
     const [loading, setLoading] = useState(true);
 
     const { t } = useLanguage();
     useEffect(() => {
         const fetchData = async () => {
             try {
-                const response = await api.get('/products/');
-                setProducts(response.data);
+                const response = await api.get<AnalyticsSummary>('/analytics/summary');
+                setSummary(response.data);
             } catch (err) {
                 console.error(err);
             } finally {
@@ -49,29 +58,16 @@ const Analytics: React.FC = () => {
     }, []);
 
     const statusData = React.useMemo(() => {
-        const counts: Record<string, number> = {};
-        products.forEach(p => {
-            counts[p.status] = (counts[p.status] || 0) + 1;
-        });
-        return Object.entries(counts).map(([name, value]) => ({ name, value }));
-    }, [products]);
+        return (summary?.by_status || []).map(s => ({ name: s.status || '—', value: s.count }));
+    }, [summary]);
 
-    const financialTrendData = [
-        { month: 'Jan', revenue: 4500, cost: 3200 },
-        { month: 'Feb', revenue: 5200, cost: 3800 },
-        { month: 'Mar', revenue: 4800, cost: 3100 },
-        { month: 'Apr', revenue: 6100, cost: 4200 },
-        { month: 'May', revenue: 5900, cost: 3900 },
-        { month: 'Jun', revenue: 7200, cost: 4800 },
-    ];
+    const financialTrendData = React.useMemo(() => {
+        return (summary?.monthly || []).map(m => ({ month: m.month, revenue: m.final_cost, cost: m.expenses }));
+    }, [summary]);
 
     const volumeByMethod = React.useMemo(() => {
-        const vol: Record<string, number> = {};
-        products.forEach(p => {
-            vol[p.shipping_method] = (vol[p.shipping_method] || 0) + (p.weight_kg || 0);
-        });
-        return Object.entries(vol).map(([name, weight]) => ({ name, weight }));
-    }, [products]);
+        return (summary?.by_shipping_method || []).map(m => ({ name: m.shipping_method || '—', weight: m.weight_kg }));
+    }, [summary]);
 
     if (loading) return (
         <div className="min-h-[60vh] flex flex-col items-center justify-center gap-4">
@@ -245,7 +241,7 @@ const Analytics: React.FC = () => {
                         </div>
                         <div className="h-[250px] relative flex items-center justify-center">
                             <div className="absolute inset-0 flex flex-col items-center justify-center pointer-events-none z-10">
-                                <div className="text-3xl font-black text-white">{products.length}</div>
+                                <div className="text-3xl font-black text-white">{summary?.count ?? 0}</div>
                                 <div className="text-[9px] font-black text-white/20 uppercase tracking-widest">{t('global')}</div>
                             </div>
                             <ResponsiveContainer width="100%" height="100%">
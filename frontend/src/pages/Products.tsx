@@ -57,21 +57,53 @@ const Products: React.FC<ProductsProps> = ({ title }) => {
         fetchProducts();
     }, []);
 
-    const filteredProducts = products.filter(p => {
-        const name = p.product_name?.toLowerCase() || '';
-        const supplier = p.supplier_name?.toLowerCase() || '';
-        const orderNum = p.order_number?.toLowerCase() || '';
-        const search = searchTerm.toLowerCase();
+    // Text search runs server-side against the full-text index
+    const [searchResults, setSearchResults] = useState<Product[] | null>(null);
 
-        const matchesSearch = name.includes(search) ||
-            supplier.includes(search) ||
-            orderNum.includes(search);
+    useEffect(() => {
+        const q = searchTerm.trim();
+        if (!q) {
+            setSearchResults(null);
+            return;
+        }
+        let cancelled = false;
+        const timer = setTimeout(async () => {
+            try {
+                const params: Record<string, string> = { q, limit: '200' };
+                if (statusFilter !== 'All') params.status = statusFilter;
+                if (paymentFilter !== 'All') params.payment_status = paymentFilter;
+                const response = await api.get('/products/search', { params });
+                if (!cancelled) setSearchResults(response.data);
+            } catch (err) {
+                console.error(err);
+            }
+        }, 250);
+        return () => {
+            cancelled = true;
+            clearTimeout(timer);
+        };
+    }, [searchTerm, statusFilter, paymentFilter]);
 
+    const filteredProducts = (searchResults ?? products).filter(p => {
         const matchesStatus = statusFilter === 'All' || p.status === statusFilter;
         const matchesPayment = paymentFilter === 'All' || p.payment_status === (paymentFilter as PaymentStatus);
-        return matchesSearch && matchesStatus && matchesPayment;
+        return matchesStatus && matchesPayment;
     });
 
+    const handleExport = async () => {
+        try {
+            const response = await api.get('/products/export', { params: { format: 'csv' }, responseType: 'blob' });
+            const url = URL.createObjectURL(response.data);
+            const link = document.createElement('a');
+            link.href = url;
+            link.download = `products-${new Date().toISOString().slice(0, 10)}.csv`;
+            link.click();
+            URL.revokeObjectURL(url);
+        } catch (err) {
+            console.error(err);
+        }
+    };
+
     const isLogistics = user?.role === UserRole.LOGISTICS;
 
     const containerVariants = {
@@ -100,7 +132,10 @@ const Products: React.FC<ProductsProps> = ({ title }) => {
                     </div>
                 </div>
                 <div className="flex gap-4">
-                    <button className="px-6 py-3 glass-morphism border-white/5 rounded-xl text-xs font-black uppercase tracking-widest text-white/40 hover:text-white transition-all flex items-center gap-2 group">
+                    <button
+                        onClick={handleExport}
+                        className="px-6 py-3 glass-morphism border-white/5 rounded-xl text-xs font-black uppercase tracking-widest text-white/40 hover:text-white transition-all flex items-center gap-2 group"
+                    >
                         <Download size={16} className="group-hover:translate-y-0.5 transition-transform" />
                         {t('export_data')}
                     </button>
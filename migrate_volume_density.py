@@ -1,37 +1,14 @@
-import sqlite3
+"""
+Superseded by backend/migrate.py, which applies every schema step in order
+(including the columns this script used to add) on SQLite and Postgres.
+Kept so existing deploy scripts that call it keep working.
+"""
 import os
+import sys
 
-def migrate():
-    db_path = os.path.join(os.path.dirname(__file__), 'backend', 'logistics.db')
-    if not os.path.exists(db_path):
-        db_path = 'backend/logistics.db' 
-        
-    print(f"Connecting to {db_path}...")
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    columns_to_add = [
-        ("total_volume", "FLOAT DEFAULT 0.0"),
-        ("density", "FLOAT DEFAULT 0.0")
-    ]
-    
-    # Check existing columns
-    cursor.execute("PRAGMA table_info(products)")
-    existing_cols = [row[1] for row in cursor.fetchall()]
-    
-    for col_name, col_def in columns_to_add:
-        if col_name not in existing_cols:
-            print(f"Adding column {col_name}...")
-            try:
-                cursor.execute(f"ALTER TABLE products ADD COLUMN {col_name} {col_def}")
-                conn.commit()
-            except Exception as e:
-                print(f"Error adding {col_name}: {e}")
-        else:
-            print(f"Column {col_name} already exists.")
-            
-    conn.close()
-    print("Migration complete.")
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from migrate import migrate
 
 if __name__ == "__main__":
     migrate()
@@ -4,22 +4,16 @@ import os
 # Ensure backend directory is in path for imports
 sys.path.append(os.path.join(os.getcwd(), 'backend'))
 
-import models
 from database import SessionLocal
-from crud import recalculate_product_costs
+from recalc_engine import recalculate_all as run_recalculation
 
 def recalculate_all():
     db = SessionLocal()
     try:
-        products = db.query(models.Product).all()
-        print(f"Found {len(products)} products to recalculate.")
-        
-        for p in products:
-            print(f"Recalculating product ID {p.id}: {p.product_name}")
-            recalculate_product_costs(p)
-            
-        db.commit()
-        print("Successfully recalculated all products.")
+        # Chunked, vectorized and resumable: re-running after a failure continues
+        # from the last committed chunk (see backend/recalc_engine.py)
+        scanned, updated = run_recalculation(db)
+        print(f"Successfully recalculated all products ({scanned} scanned, {updated} changed).")
     except Exception as e:
         db.rollback()
         print(f"Error during recalculation: {e}")
@@ -0,0 +1,170 @@
+import sys
+import os
+
+# Audit sink delivery and diff-based product history
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+
+def test_buffered_audit_sink(tmp_path):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from database import Base
+    import models, audit
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'audit.db'}")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+
+    sink = audit.AuditSink(mode="buffered", session_factory=Session, batch_size=50, flush_interval_ms=20)
+    previous, audit.sink = audit.sink, sink
+    sink.start()
+    try:
+        db = Session()
+        for i in range(120):
+            audit.record(db, 1, None, "Committed", {"n": i})
+        # Nothing is queued until the transaction commits
+        assert sink._queue.qsize() == 0
+        db.commit()
+
+        audit.record(db, 1, None, "Rolled back", {})
+        db.rollback()
+
+        sink.flush()
+        assert db.query(models.AuditLog).filter(models.AuditLog.action == "Committed").count() == 120
+        assert db.query(models.AuditLog).filter(models.AuditLog.action == "Rolled back").count() == 0
+
+        audit.record(db, 1, None, "At shutdown", {})
+        db.commit()
+        sink.stop()
+        assert not sink.running
+        assert db.query(models.AuditLog).filter(models.AuditLog.action == "At shutdown").count() == 1
+        db.close()
+    finally:
+        sink.stop()
+        audit.sink = previous
+
+
+def test_product_state_reconstruction(tmp_path):
+    from datetime import datetime, timedelta
+    from sqlalchemy.orm import sessionmaker
+    from database import Base, create_db_engine
+    import models, schemas, crud
+
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'state.db'}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    user = models.User(username="u", email="u@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+
+    product = crud.create_product(db, schemas.ProductCreate(
+        product_name="Lamp", supplier_name="S", order_number="O-1", price_cny=10, cny_rate=12.5, quantity=2,
+    ), user.id)
+    versions = [(datetime.utcnow(), 2, "Pending")]
+    for quantity, status in [(5, "In Transit"), (8, "Delivered")]:
+        crud.update_product(db, product.id, schemas.ProductUpdate(quantity=quantity, status=status), user.id)
+        versions.append((datetime.utcnow(), quantity, status))
+
+    # Updates store only what changed
+    log = db.query(models.AuditLog).filter(models.AuditLog.action == "Updated Product").first()
+    assert set(log.details) == {"changes"}
+    assert log.details["changes"]["quantity"] == [2, 5]
+    assert "product_name" not in log.details["changes"]
+
+    for at, quantity, status in versions:
+        state = crud.get_product_state_at(db, product.id, at)
+        assert (state["quantity"], state["status"]) == (quantity, status)
+    assert crud.get_product_state_at(db, product.id, product.created_at - timedelta(seconds=1)) is None
+
+    # History stays available after the product is deleted
+    crud.delete_product(db, product.id, user.id)
+    for at, quantity, status in versions:
+        state = crud.get_product_state_at(db, product.id, at)
+        assert (state["quantity"], state["status"]) == (quantity, status)
+        assert state["product_name"] == "Lamp"
+    assert crud.get_product_state_at(db, product.id, datetime.utcnow()) is None
+    assert crud.get_product_state_at(db, product.id, product.created_at - timedelta(seconds=1)) is None
+    db.close()
+
+
+def test_retention_compacts_and_archives(tmp_path):
+    from datetime import datetime, timedelta
+    from sqlalchemy.orm import sessionmaker
+    from database import Base, create_db_engine
+    import models, audit_retention
+
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'retention.db'}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    old = datetime.utcnow() - timedelta(days=100)
+
+    def log(minutes, action, details, user_id=1):
+        db.add(models.AuditLog(user_id=user_id, product_id=1, action=action, details=details,
+                               timestamp=old + timedelta(minutes=minutes)))
+
+    log(0, "Created Product", {"after": {"quantity": 1, "status": "Pending"}})
+    log(1, "Updated Product", {"changes": {"quantity": [1, 2]}})
+    log(2, "Updated Product", {"changes": {"quantity": [2, 3], "status": ["Pending", "Shipped"]}})
+    log(3, "Updated Product", {"changes": {"status": ["Shipped", "Pending"]}})
+    log(4, "Updated Product", {"changes": {"quantity": [3, 4]}}, user_id=2)
+    db.commit()
+
+    # The three diffs by user 1 collapse into one; status ended where it started
+    assert audit_retention.compact(db, days=30, progress=lambda m: None) == 2
+    updates = db.query(models.AuditLog).filter(models.AuditLog.action == "Updated Product").order_by(models.AuditLog.id).all()
+    assert [u.details["changes"] for u in updates] == [{"quantity": [1, 3]}, {"quantity": [3, 4]}]
+
+    archived, batches = audit_retention.archive(db, days=30, batch_size=2, progress=lambda m: None)
+    assert (archived, batches) == (3, 2)
+    assert db.query(models.AuditLog).count() == 0
+    rows = [r for a in db.query(models.AuditLogArchive).order_by(models.AuditLogArchive.id) for r in audit_retention.unpack(a)]
+    assert [r["action"] for r in rows] == ["Created Product", "Updated Product", "Updated Product"]
+    db.close()
+
+
+def test_state_reconstruction_refuses_pruned_history(tmp_path):
+    from datetime import datetime
+    import pytest
+    from sqlalchemy.orm import sessionmaker
+    from database import Base, create_db_engine
+    import models, schemas, crud, audit_retention
+
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'pruned.db'}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    user = models.User(username="u", email="u@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+
+    product = crud.create_product(db, schemas.ProductCreate(
+        product_name="Lamp", supplier_name="S", order_number="O-1", price_cny=10, cny_rate=12.5, quantity=2,
+    ), user.id)
+    versions = [datetime.utcnow()]
+    for quantity in (5, 8):
+        crud.update_product(db, product.id, schemas.ProductUpdate(quantity=quantity), user.id)
+        versions.append(datetime.utcnow())
+
+    # The two diffs merge: the state between them is gone, the ones around them remain
+    assert audit_retention.compact(db, days=0, progress=lambda m: None) == 1
+    assert crud.get_product_state_at(db, product.id, versions[0])["quantity"] == 2
+    assert crud.get_product_state_at(db, product.id, versions[2])["quantity"] == 8
+    with pytest.raises(ValueError, match="compacted"):
+        crud.get_product_state_at(db, product.id, versions[1])
+
+    # Archiving takes the delete entry too; older points in time are refused rather than answered wrongly
+    crud.delete_product(db, product.id, user.id)
+    audit_retention.archive(db, days=0, progress=lambda m: None)
+    for at in versions:
+        with pytest.raises(ValueError, match="archived"):
+            crud.get_product_state_at(db, product.id, at)
+    assert crud.get_product_state_at(db, product.id, datetime.utcnow()) is None
+    db.close()
+
+
+if __name__ == "__main__":
+    import tempfile, pathlib
+    test_buffered_audit_sink(pathlib.Path(tempfile.mkdtemp()))
+    test_product_state_reconstruction(pathlib.Path(tempfile.mkdtemp()))
+    test_retention_compacts_and_archives(pathlib.Path(tempfile.mkdtemp()))
+    test_state_reconstruction_refuses_pruned_history(pathlib.Path(tempfile.mkdtemp()))
+    print("Audit sink, state reconstruction and retention OK.")
@@ -0,0 +1,34 @@
+import sys
+import os
+
+# Packaging size grammar: explicit units, separators and the unitless fallback
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+from dimensions import parse_dimensions
+
+
+def test_explicit_units():
+    for text in ["50x40x30 cm", "500×400×300мм", "0.5 * 0.4 * 0.3 m", "50 см х 40 см х 30 см", "50cm x 40cm x 0.3m"]:
+        dims = parse_dimensions(text)
+        assert dims.cm == (50.0, 40.0, 30.0), text
+        assert dims.volume_m3(2) == 0.12, text
+
+
+def test_unitless_heuristic():
+    # Box product above 10 is centimetres, otherwise metres
+    assert parse_dimensions("50x40x30").unit == "cm"
+    assert parse_dimensions("0.4*0.4*0.4").unit == "m"
+    assert parse_dimensions("120,5 x 80 x 60").cm == (120.5, 80.0, 60.0)
+    # Free text still yields the first three numbers
+    assert parse_dimensions("Box 50/40/30").cm == (50.0, 40.0, 30.0)
+
+
+def test_unparseable():
+    for text in [None, "", "abc", "1x2"]:
+        assert parse_dimensions(text) is None
+
+
+if __name__ == "__main__":
+    test_explicit_units()
+    test_unitless_heuristic()
+    test_unparseable()
+    print("Dimension parser OK.")
@@ -0,0 +1,75 @@
+import sys
+import os
+import io
+from datetime import datetime
+
+# Spreadsheet import: blank cells must fall back to ProductCreate defaults
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+import pandas as pd
+
+
+def test_blank_cells_are_missing():
+    import importer
+
+    payload = importer._row_payload({
+        "product_name": " Lamp ", "departure_date": pd.NaT, "price": float("nan"), "category": "  ", "quantity": 3,
+    })
+    assert payload == {"product_name": "Lamp", "quantity": 3}
+
+
+def test_import_xlsx_with_blank_date_cell(tmp_path):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from database import Base
+    import models, importer
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'import.db'}")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+
+    frame = pd.DataFrame({
+        "Product Name": ["Lamp", "Chair"],
+        "Supplier Name": ["Guangzhou Light", "Foshan Furniture"],
+        "Order Number": ["ORD-1", "ORD-2"],
+        "Price CNY": [12.5, 80],
+        "Departure Date": [datetime(2026, 3, 1), pd.NaT],
+    })
+    source = io.BytesIO()
+    frame.to_excel(source, index=False)
+    source.seek(0)
+
+    db = Session()
+    try:
+        result = importer.import_products(db, source, "manifest.xlsx", user_id=1)
+        assert result["errors"] == [] and result["inserted"] == 2
+        dates = dict(db.query(models.Product.product_name, models.Product.departure_date).all())
+        assert dates == {"Lamp": datetime(2026, 3, 1), "Chair": None}
+    finally:
+        db.close()
+
+
+def test_import_keeps_total_volume_like_create_product(tmp_path):
+    from sqlalchemy.orm import sessionmaker
+    from database import Base, create_db_engine
+    import models, schemas, crud, importer
+
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'volume.db'}")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    row = {"product_name": "Crate", "supplier_name": "Ningbo Crates", "order_number": "ORD-3", "packaging_size": "big box", "total_volume": 2.5, "weight_per_box": 10, "places_count": 4}
+
+    source = io.BytesIO()
+    pd.DataFrame([row]).to_csv(source, index=False)
+    source.seek(0)
+
+    db = Session()
+    try:
+        result = importer.import_products(db, source, "manifest.csv", user_id=1)
+        assert result["errors"] == [] and result["inserted"] == 1
+        created = crud.create_product(db, schemas.ProductCreate(**row), user_id=1)
+        imported = db.query(models.Product).filter(models.Product.id != created.id).one()
+        assert imported.total_volume == created.total_volume == 2.5
+        assert imported.density == created.density == 16.0
+    finally:
+        db.close()
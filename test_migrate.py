@@ -0,0 +1,123 @@
+import sys
+import os
+
+# Versioned migrations on a database laid out like one from before the migration engine
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+LEGACY_SCHEMA = [
+    "CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR, email VARCHAR, hashed_password VARCHAR, role VARCHAR, created_at DATETIME)",
+    "CREATE TABLE products (id INTEGER PRIMARY KEY, product_name VARCHAR, quantity INTEGER, price FLOAT, packaging_size VARCHAR(100), created_at DATETIME, updated_at DATETIME)",
+    "CREATE TABLE settings (id INTEGER PRIMARY KEY, key VARCHAR, value FLOAT, description VARCHAR)",
+    "CREATE TABLE audit_logs (id INTEGER PRIMARY KEY, user_id INTEGER, product_id INTEGER, action VARCHAR, details JSON, timestamp DATETIME)",
+]
+
+
+def test_migrate_legacy_database(tmp_path, monkeypatch):
+    from sqlalchemy import create_engine, event, inspect, text
+    import migrate
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        for ddl in LEGACY_SCHEMA:
+            conn.execute(text(ddl))
+        conn.execute(text("INSERT INTO products (product_name, quantity, price, packaging_size) VALUES (:n, :q, 1, :s)"), [
+            {"n": f"P{i}", "q": None if i % 2 else 3, "s": ["50x40x30", "500х400х300 мм", None, "n/a"][i % 4]}
+            for i in range(25)
+        ])
+    monkeypatch.setattr(migrate, "MIGRATION_BATCH_SIZE", 4)
+
+    assert migrate.migrate(engine) == len(migrate.STEPS)
+
+    inspector = inspect(engine)
+    product_columns = {c["name"] for c in inspector.get_columns("products")}
+    assert {"price_cny", "final_cost", "density", "specifications", "package_length", "package_unit"} <= product_columns
+    assert "updated_at" in {c["name"] for c in inspector.get_columns("settings")}
+    assert {"ix_audit_logs_product_ts", "ix_audit_logs_ts"} <= {i["name"] for i in inspector.get_indexes("audit_logs")}
+    assert {"audit_log_archive", "media_assets", "schema_version"} <= set(inspector.get_table_names())
+
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM products WHERE quantity IS NULL")).scalar() == 0
+        rows = conn.execute(text("SELECT packaging_size, package_length, package_height, package_unit FROM products")).all()
+    for size, length, height, unit in rows:
+        if size == "50x40x30":
+            assert (length, height, unit) == (50.0, 30.0, "cm")
+        elif size == "500х400х300 мм":
+            assert (length, height, unit) == (50.0, 30.0, "mm")
+        else:
+            assert unit is None
+
+    # Up to date: a single query, nothing applied
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    assert migrate.migrate(engine) == 0
+    assert len(statements) == 1
+
+
+def test_migrate_applies_missing_step(tmp_path):
+    from sqlalchemy import create_engine, text
+    import migrate
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    assert migrate.migrate(engine) == len(migrate.STEPS)
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM schema_version WHERE version = 6"))
+        conn.execute(text("INSERT INTO products (product_name, quantity, price, packaging_size) VALUES ('late', 1, 1, '60x40x20')"))
+
+    assert migrate.migrate(engine) == 1
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT package_width FROM products WHERE product_name = 'late'")).scalar() == 40.0
+        assert conn.execute(text("SELECT count(*) FROM schema_version")).scalar() == len(migrate.STEPS)
+
+
+def test_concurrent_backfill_runs_each_batch_once(tmp_path, monkeypatch):
+    import threading
+    from sqlalchemy import create_engine, text
+    import migrate
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'race.db'}", connect_args={"timeout": 30})
+    migrate.migrate(engine)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO products (product_name, quantity, price) VALUES ('p', 1, 1)"), [{}] * 40)
+
+    handled = []
+
+    def count_batch(conn, after):
+        keys = conn.execute(
+            text("SELECT id FROM products WHERE id > :after ORDER BY id LIMIT 3"), {"after": after or 0}
+        ).scalars().all()
+        handled.extend(keys)
+        return keys[-1] if keys else None
+
+    monkeypatch.setattr(migrate, "STEPS", migrate.STEPS + [(99, "test backfill", None, count_batch)])
+    results = []
+    workers = [threading.Thread(target=lambda: results.append(migrate.migrate(engine))) for _ in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert sorted(handled) == list(range(1, 41))
+    assert sorted(results) == [0, 0, 1]
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM schema_backfill")).scalar() == 0
+
+
+def test_failed_migration_stops_startup(tmp_path, monkeypatch):
+    import pytest
+    from sqlalchemy import create_engine, inspect
+    import main, migrate
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'broken.db'}")
+
+    def broken_step(conn):
+        raise RuntimeError("broken step")
+
+    monkeypatch.setattr(migrate, "STEPS", migrate.STEPS + [(99, "broken", broken_step, None)])
+    monkeypatch.setattr(main, "migrate", lambda: migrate.migrate(engine))
+
+    with pytest.raises(RuntimeError, match="broken step"):
+        main.startup_event()
+    # The tables exist but the failed step is left pending for the next start
+    assert "products" in inspect(engine).get_table_names()
+    with engine.connect() as conn:
+        assert 99 not in migrate.applied_versions(conn)
@@ -0,0 +1,30 @@
+import sys
+import os
+
+# Keyset pagination over products
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+
+def test_projected_page_loads_cursor_keys_up_front(tmp_path):
+    from sqlalchemy import create_engine, event
+    from sqlalchemy.orm import sessionmaker
+    from database import Base
+    import models, crud
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'page.db'}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    for i in range(5):
+        db.add(models.Product(product_name=f"P{i}", quantity=1, price=1.0))
+    db.commit()
+    db.close()
+
+    db = sessionmaker(bind=engine)()
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    page = crud.get_products_page(db, limit=2, columns=("id", "product_name"))
+
+    assert page["has_more"] and page["next_cursor"]
+    assert len(statements) == 1
+    assert [p.id for p in crud.get_products_page(db, cursor=page["next_cursor"], limit=2)["items"]] == [3, 2]
+    db.close()
@@ -0,0 +1,74 @@
+import sys
+import os
+from types import SimpleNamespace
+
+# /products endpoints on both data layers: sync crud in the threadpool and async_crud (ASYNC_DB=1)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+import pytest
+
+
+@pytest.fixture(params=["sync", "async"])
+def client(request, tmp_path, monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+    import database, dependencies, models
+    from routers import products
+
+    url = f"sqlite:///{tmp_path / 'products.db'}"
+    engine = database.create_db_engine(url)
+    database.Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(bind=engine, autoflush=False, expire_on_commit=False))
+    if request.param == "async":
+        async_url = database.async_database_url(url)
+        async_engine = create_async_engine(async_url, **database.engine_options(async_url))
+        monkeypatch.setattr(database, "ASYNC_DB_ENABLED", True)
+        monkeypatch.setattr(database, "AsyncSessionLocal",
+                            async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False))
+
+        def no_threadpool(*args, **kwargs):
+            raise AssertionError("async mode must not use the threadpool")
+        monkeypatch.setattr(products, "run_in_threadpool", no_threadpool)
+    else:
+        monkeypatch.setattr(database, "ASYNC_DB_ENABLED", False)
+
+    async def admin():
+        return SimpleNamespace(id=1, role=models.UserRole.ADMIN)
+
+    app = FastAPI()
+    app.include_router(products.router)
+    app.dependency_overrides[dependencies.get_current_active_user] = admin
+    with TestClient(app) as c:
+        yield c
+
+
+def test_product_crud_and_listing(client):
+    ids = [
+        client.post("/products/", json={
+            "product_name": f"Lamp {i}", "supplier_name": "S", "order_number": f"O-{i}",
+            "price_cny": 10, "cny_rate": 12, "quantity": 2, "packaging_size": "50x40x30",
+        }).json()["id"]
+        for i in range(3)
+    ]
+
+    listing = client.get("/products/")
+    assert [p["id"] for p in listing.json()] == ids[::-1]
+    assert client.get("/products/", headers={"If-None-Match": listing.headers["etag"]}).status_code == 304
+
+    page = client.get("/products/page", params={"limit": 2, "fields": "product_name"}).json()
+    assert page["items"] == [{"id": ids[2], "product_name": "Lamp 2"}, {"id": ids[1], "product_name": "Lamp 1"}]
+    rest = client.get("/products/page", params={"cursor": page["next_cursor"]}).json()
+    assert [p["id"] for p in rest["items"]] == [ids[0]] and not rest["has_more"]
+
+    product = client.get(f"/products/{ids[0]}").json()
+    assert product["package_length"] == 50.0 and product["final_cost"] > 0
+    assert client.patch(f"/products/{ids[0]}", json={"quantity": 5}).json()["quantity"] == 5
+
+    assert client.delete(f"/products/{ids[1]}").status_code == 204
+    assert client.delete(f"/products/{ids[1]}").status_code == 404
+    assert client.get(f"/products/{ids[1]}").status_code == 404
+    batch = client.post("/products/batch", json={"operations": [{"op": "delete", "id": ids[2]}]}).json()
+    assert batch["applied"] == 1
+    assert [p["id"] for p in client.get("/products/").json()] == [ids[0]]
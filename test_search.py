@@ -0,0 +1,24 @@
+import sys
+import os
+
+# Product search fallback when no full-text index is available
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+
+def test_like_fallback_treats_wildcards_literally(tmp_path, monkeypatch):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from database import Base
+    import models, search
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'search.db'}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    for name in ("ab_1 bolts", "abX1 bolts", "50% off"):
+        db.add(models.Product(product_name=name, quantity=1, price=1.0))
+    db.commit()
+    monkeypatch.setattr(search, "_backend", None)
+
+    assert [p.product_name for p in search.search_products(db, "ab_1")] == ["ab_1 bolts"]
+    assert [p.product_name for p in search.search_products(db, "bolts")] == ["abX1 bolts", "ab_1 bolts"]
+    db.close()
@@ -0,0 +1,352 @@
+import sys
+import os
+import asyncio
+import hashlib
+import tempfile
+import tracemalloc
+from types import SimpleNamespace
+from email.parser import BytesParser
+from email.policy import HTTP
+
+# Upload proxy against an in-process fake Cloudinary transport; no network
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy.orm import sessionmaker
+import dependencies
+import models
+import upload_sessions
+from database import Base, create_db_engine, get_db
+from routers import upload
+
+# Private database: earlier test modules may already have bound the shared engine to backend/logistics.db
+engine = create_db_engine("sqlite:///" + os.path.join(tempfile.mkdtemp(), "upload.db"))
+Base.metadata.create_all(bind=engine)
+TestSession = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+
+def override_get_db():
+    db = TestSession()
+    try:
+        yield db
+    finally:
+        db.close()
+
+MB = 1024 * 1024
+
+
+class FakeCloudinary(httpx.AsyncBaseTransport):
+    """
+    Consumes the streamed body chunk by chunk, like a real server would.
+    (httpx.MockTransport reads the whole request body before calling its
+    handler, which would hide any buffering in the proxy.)
+    """
+
+    def __init__(self, keep_body=False, delay=0.0, fail_sizes=()):
+        self.keep_body = keep_body
+        self.delay = delay
+        self.fail_sizes = set(fail_sizes)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.requests = 0
+        self.calls = []
+        self.received = 0
+        self.sha256 = None
+        self.body = b""
+        self.headers = None
+
+    async def handle_async_request(self, request: httpx.Request):
+        self.requests += 1
+        number = self.requests
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        self.headers = request.headers
+        digest = hashlib.sha256()
+        received = 0
+        body = b""
+        async for chunk in request.stream:
+            received += len(chunk)
+            digest.update(chunk)
+            if self.keep_body:
+                body += chunk
+        self.received = received
+        self.sha256 = digest.hexdigest()
+        self.body = body
+        self.calls.append((request.headers, body))
+        await asyncio.sleep(self.delay)
+        self.in_flight -= 1
+        if any(size <= received < size + 1024 for size in self.fail_sizes):
+            return httpx.Response(400, json={"error": {"message": "Invalid image file"}})
+        return httpx.Response(200, json={
+            "secure_url": f"https://res.cloudinary.com/demo/image/upload/v1/logistics/{number}.jpg",
+            "public_id": f"logistics/{number}",
+            "resource_type": "image",
+            "format": "jpg",
+            "bytes": received,
+        })
+
+
+def make_app():
+    app = FastAPI()
+    app.include_router(upload.router)
+    app.dependency_overrides[dependencies.get_current_active_user] = lambda: SimpleNamespace(id=1, role=models.UserRole.ADMIN)
+    app.dependency_overrides[get_db] = override_get_db
+    return app
+
+
+def configure(monkeypatch, fake):
+    monkeypatch.setattr(upload, "CLOUDINARY_CLOUD_NAME", "demo")
+    monkeypatch.setattr(upload, "CLOUDINARY_API_KEY", "key")
+    monkeypatch.setattr(upload, "CLOUDINARY_API_SECRET", "secret")
+    monkeypatch.setattr(upload, "SessionLocal", TestSession)
+    upload.set_http_client(httpx.AsyncClient(transport=fake))
+
+
+def multipart_parts(headers, body):
+    message = BytesParser(policy=HTTP).parsebytes(
+        b"Content-Type: " + headers["content-type"].encode() + b"\r\n\r\n" + body
+    )
+    return {part.get_param("name", header="content-disposition"): part for part in message.iter_parts()}
+
+
+def write_file(path, size):
+    block = os.urandom(MB)
+    with open(path, "wb") as fh:
+        for _ in range(size // MB):
+            fh.write(block)
+        fh.write(block[: size % MB])
+
+
+async def post_file(app, path, filename="photo.jpg"):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        with open(path, "rb") as fh:
+            return await client.post("/upload/media", files={"file": (filename, fh, "image/jpeg")})
+
+
+def test_upload_forwards_signed_multipart(monkeypatch, tmp_path):
+    fake = FakeCloudinary(keep_body=True)
+    configure(monkeypatch, fake)
+    path = tmp_path / "small.jpg"
+    write_file(path, 300 * 1024 + 7)
+
+    response = asyncio.run(post_file(make_app(), path, filename="фото.jpg"))
+    assert response.status_code == 200, response.text
+    assert response.json()["public_id"] == "logistics/1"
+
+    parts = multipart_parts(fake.headers, fake.body)
+    assert parts["file"].get_payload(decode=True) == path.read_bytes()
+    assert parts["file"].get_filename() == "фото.jpg"
+    fields = {name: part.get_content().strip() for name, part in parts.items() if name != "file"}
+    assert fields["folder"] == "logistics" and fields["api_key"] == "key"
+    assert fields["signature"] == upload._make_signature(
+        {"folder": "logistics", "timestamp": fields["timestamp"]}, "secret"
+    )
+    assert int(fake.headers["content-length"]) == len(fake.body)
+
+
+def test_upload_streams_with_bounded_memory(monkeypatch, tmp_path):
+    fake = FakeCloudinary()
+    configure(monkeypatch, fake)
+    size = 40 * MB
+    path = tmp_path / "video.mp4"
+    write_file(path, size)
+
+    tracemalloc.start()
+    try:
+        response = asyncio.run(post_file(make_app(), path, filename="video.mp4"))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert response.status_code == 200, response.text
+    assert fake.received > size
+    print(f"peak traced memory for a {size // MB} MB upload: {peak / MB:.1f} MB")
+    # A few chunks in flight, never the whole file
+    assert peak < 8 * MB
+
+
+def test_upload_size_limit(monkeypatch, tmp_path):
+    fake = FakeCloudinary()
+    configure(monkeypatch, fake)
+    monkeypatch.setattr(upload, "MAX_UPLOAD_BYTES", 2 * MB)
+    path = tmp_path / "big.jpg"
+    write_file(path, 3 * MB)
+
+    response = asyncio.run(post_file(make_app(), path))
+    assert response.status_code == 413
+    assert fake.requests == 0
+
+
+def test_empty_upload_rejected(monkeypatch, tmp_path):
+    fake = FakeCloudinary()
+    configure(monkeypatch, fake)
+    path = tmp_path / "empty.jpg"
+    path.write_bytes(b"")
+
+    response = asyncio.run(post_file(make_app(), path))
+    assert response.status_code == 400
+    assert fake.requests == 0
+
+
+async def post_batch(app, paths):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        handles = [open(p, "rb") for p in paths]
+        try:
+            files = [("files", (os.path.basename(p), fh, "image/jpeg")) for p, fh in zip(paths, handles)]
+            return await client.post("/upload/media/batch", files=files)
+        finally:
+            for fh in handles:
+                fh.close()
+
+
+def test_batch_upload_keeps_order_and_bounds_concurrency(monkeypatch, tmp_path):
+    # File 2 is rejected by Cloudinary; the others still go through
+    sizes = [40 * 1024 * (i + 1) for i in range(8)]
+    fake = FakeCloudinary(delay=0.05, fail_sizes=[sizes[2]])
+    configure(monkeypatch, fake)
+    monkeypatch.setattr(upload, "UPLOAD_CONCURRENCY", 3)
+    monkeypatch.setattr(upload, "_upload_slots", None)
+    paths = []
+    for i, size in enumerate(sizes):
+        path = tmp_path / f"photo{i}.jpg"
+        write_file(path, size)
+        paths.append(str(path))
+
+    response = asyncio.run(post_batch(make_app(), paths))
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert fake.requests == len(sizes)
+    assert fake.max_in_flight == 3
+    assert body["uploaded"] == 7 and body["failed"] == 1
+
+    for i, (path, result) in enumerate(zip(paths, body["results"])):
+        assert result["index"] == i and result["filename"] == os.path.basename(path)
+        if i == 2:
+            assert not result["ok"] and result["status_code"] == 502
+            continue
+        # The fake reports the multipart body size, which grows with the file
+        assert result["ok"] and sizes[i] < result["bytes"] < sizes[i] + 1024
+
+
+def test_batch_upload_rejects_too_many_files(monkeypatch, tmp_path):
+    fake = FakeCloudinary()
+    configure(monkeypatch, fake)
+    monkeypatch.setattr(upload, "MAX_BATCH_FILES", 2)
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"photo{i}.jpg"
+        write_file(path, 1024)
+        paths.append(str(path))
+
+    response = asyncio.run(post_batch(make_app(), paths))
+    assert response.status_code == 400
+    assert fake.requests == 0
+
+
+def test_resumable_upload_out_of_order_with_retry(monkeypatch, tmp_path):
+    fake = FakeCloudinary(keep_body=True)
+    configure(monkeypatch, fake)
+    monkeypatch.setattr(upload_sessions, "UPLOAD_STAGING_DIR", str(tmp_path / "staging"))
+    monkeypatch.setattr(upload, "CLOUDINARY_CHUNK_SIZE", 5 * MB)
+    path = tmp_path / "video.mp4"
+    write_file(path, 12 * MB + 123)
+    data = path.read_bytes()
+    chunk = 4 * MB
+    pieces = {offset: data[offset:offset + chunk] for offset in range(0, len(data), chunk)}
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=make_app())
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            created = await client.post("/upload/resumable", json={
+                "filename": "video.mp4", "size": len(data), "content_type": "video/mp4",
+                "sha256": hashlib.sha256(data).hexdigest(),
+            })
+            assert created.status_code == 200, created.text
+            upload_id = created.json()["upload_id"]
+
+            async def put(offset, body, checksum=None):
+                checksum = checksum or hashlib.sha256(body).hexdigest()
+                return await client.put(f"/upload/resumable/{upload_id}", params={"offset": offset},
+                                        content=body, headers={"X-Chunk-Sha256": checksum})
+
+            # Connection "drops" after chunks 3 and 0 arrive, and chunk 1 arrives corrupted
+            for offset in (12 * MB, 0, 8 * MB):
+                assert (await put(offset, pieces[offset])).status_code == 200
+            corrupted = await put(chunk, b"\0" * chunk, checksum=hashlib.sha256(pieces[chunk]).hexdigest())
+            assert corrupted.status_code == 400
+
+            status = (await client.get(f"/upload/resumable/{upload_id}")).json()
+            assert status["missing"] == [[chunk, 2 * chunk]] and not status["complete"]
+            early = await client.post(f"/upload/resumable/{upload_id}/complete")
+            assert early.status_code == 409 and fake.requests == 0
+
+            assert (await put(chunk, pieces[chunk])).json()["complete"]
+            done = await client.post(f"/upload/resumable/{upload_id}/complete")
+            assert done.status_code == 200, done.text
+            return upload_id
+
+    upload_id = asyncio.run(scenario())
+
+    # Forwarded as 5 MB chunks sharing one upload id
+    assert [headers["content-range"] for headers, _ in fake.calls] == [
+        f"bytes 0-{5 * MB - 1}/{len(data)}",
+        f"bytes {5 * MB}-{10 * MB - 1}/{len(data)}",
+        f"bytes {10 * MB}-{len(data) - 1}/{len(data)}",
+    ]
+    assert {headers["x-unique-upload-id"] for headers, _ in fake.calls} == {upload_id}
+    sent = b"".join(multipart_parts(headers, body)["file"].get_payload(decode=True) for headers, body in fake.calls)
+    assert sent == data
+    assert not os.path.exists(os.path.join(upload_sessions.UPLOAD_STAGING_DIR, upload_id))
+
+
+def test_resumable_sessions_expire(monkeypatch, tmp_path):
+    monkeypatch.setattr(upload_sessions, "UPLOAD_STAGING_DIR", str(tmp_path / "staging"))
+    meta = upload_sessions.create("photo.jpg", "image/jpeg", 10, user_id=1)
+    session_dir = os.path.join(upload_sessions.UPLOAD_STAGING_DIR, meta["upload_id"])
+
+    assert upload_sessions.gc(now=meta["updated_at"] + 60) == 0
+    assert os.path.isdir(session_dir)
+    assert upload_sessions.gc(now=meta["updated_at"] + upload_sessions.UPLOAD_SESSION_TTL_SECONDS + 1) == 1
+    assert not os.path.exists(session_dir)
+
+
+def test_repeat_upload_served_from_cache(monkeypatch, tmp_path):
+    fake = FakeCloudinary()
+    configure(monkeypatch, fake)
+    monkeypatch.setattr(upload_sessions, "UPLOAD_STAGING_DIR", str(tmp_path / "staging"))
+    path = tmp_path / "supplier.jpg"
+    write_file(path, 200 * 1024)
+    app = make_app()
+
+    async def stats():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return (await client.get("/upload/stats")).json()
+
+    before = asyncio.run(stats())
+    first = asyncio.run(post_file(app, path)).json()
+    again = asyncio.run(post_file(app, path, filename="same-photo-again.jpg")).json()
+    batch = asyncio.run(post_batch(app, [str(path), str(path)])).json()
+    assert fake.requests == 1
+    assert not first["cached"] and again["cached"]
+    assert again["url"] == first["url"] and again["bytes"] == first["bytes"]
+    assert [r["url"] for r in batch["results"]] == [first["url"]] * 2
+
+    after = asyncio.run(stats())
+    assert after["hits"] - before["hits"] == 3
+    assert after["misses"] - before["misses"] == 1
+    assert after["bytes_saved"] - before["bytes_saved"] == 3 * first["bytes"]
+
+    # A resumable upload of the same content is answered from the cache too
+    data = path.read_bytes()
+
+    async def resumable():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            upload_id = (await client.post("/upload/resumable", json={"filename": "x.jpg", "size": len(data)})).json()["upload_id"]
+            await client.put(f"/upload/resumable/{upload_id}", params={"offset": 0}, content=data)
+            return (await client.post(f"/upload/resumable/{upload_id}/complete")).json()
+
+    assert asyncio.run(resumable())["url"] == first["url"]
+    assert fake.requests == 1